@@ -1,10 +1,12 @@
+import collections
 import sys
-from functools import partial
-from multiprocessing import Pool
 import numpy as np
 import scipy as sp
-from scipy import integrate, interpolate
 
+import coefficients
+import instrument
+import integration
+import piecewise
 import structure
 import util
 
@@ -14,13 +16,17 @@ class MoIXXCalculator:
     def __init__(self, load_case):
         self.load_case = load_case
 
-    def calc(self, size):
-        pool = Pool(size)
-        results = pool.map(self.value, self.load_case.range)
-        pool.close()
-        pool.join()
-        func = interpolate.interp1d(self.load_case.range, results, kind='cubic', fill_value="extrapolate")
-        self.load_case.wing.wing_box.moi_xx = func
+    @instrument.traced
+    def calc(self):
+        wing_box = self.load_case.wing.wing_box
+        properties = wing_box.calc_properties()
+        if properties is not None:
+            func = properties.moi_xx
+        else:
+            # geometry that is not polynomial in y is sampled on the stations instead
+            results = self.value(self.load_case.range)
+            func = piecewise.interpolate_sections(self.load_case.range, results, wing_box.sections)
+        wing_box.attach_moi("moi_xx", func)
         return func
 
     def value(self, y):
@@ -32,13 +38,16 @@ class MoIPolarCalculator:
     def __init__(self, load_case):
         self.load_case = load_case
 
-    def calc(self, size):
-        pool = Pool(size)
-        results = pool.map(self.value, self.load_case.range)
-        pool.close()
-        pool.join()
-        func = interpolate.interp1d(self.load_case.range, results, kind='cubic', fill_value="extrapolate")
-        self.load_case.wing.wing_box.moi_polar = func
+    @instrument.traced
+    def calc(self):
+        wing_box = self.load_case.wing.wing_box
+        properties = wing_box.calc_properties()
+        if properties is not None:
+            func = properties.moi_polar
+        else:
+            results = self.value(self.load_case.range)
+            func = piecewise.interpolate_sections(self.load_case.range, results, wing_box.sections)
+        wing_box.attach_moi("moi_polar", func)
         return func
 
     def value(self, y):
@@ -51,39 +60,42 @@ class ShearCalculator:
         self.load_case = load_case
         self.wing_box = load_case.wing.wing_box
 
-    def calc(self, size):
-        pool = Pool(size)
-        results = pool.map(self.value, self.load_case.range)
-        pool.close()
-        pool.join()
-        self.print_result(results)
-        return interpolate.interp1d(self.load_case.range, results, kind='cubic', fill_value="extrapolate")
+    @instrument.traced
+    def calc(self, aero_shear=None):
+        shear = self.calc_distribution(integration.SpanwiseIntegrator.from_load_case(self.load_case), aero_shear)
+        self.print_result(shear(self.load_case.range))
+        return shear
 
-    def value(self, y):
-        return self.shear(y) + self.fuel(y) + self.weight_wing_box(y) + self.weight_wing(y)+ self.engine(y)
+    def calc_distribution(self, integrator, aero_shear=None):
+        if aero_shear is None:
+            aero_shear = self.calc_aero()
+        return piecewise.add(aero_shear, integrator.integrate(self.load, from_tip=True), self.engine_step())
+
+    @instrument.traced
+    def calc_aero(self):
+        # the lift does not depend on the wing box, so it is integrated (and cached) on its own
+        return self.load_case.wing.loads.lift_from_tip(self.wing_box.end_y)
 
-    def shear(self, y):
-        func = lambda y2: self.load_case.wing.lift(y2, self.load_case.density, self.load_case.velocity)
-        return integrate.quad(func, y, self.wing_box.end_y)[0]
+    def load(self, y):
+        return self.fuel(y) + self.weight_wing_box(y) + self.weight_wing(y)
 
     def fuel(self, y):
-        return - integrate.quad(self.load_case.wing.fuel_tank.fuel_cross_section, y,
-                                self.wing_box.end_y, limit=100, epsrel=1.49e-06)[0] * structure.FuelTank.rho_fuel * 9.81
+        return - self.load_case.wing.fuel_tank.fuel_cross_section(y) * structure.FuelTank.rho_fuel * 9.81
 
     def weight_wing_box(self, y):
-        return -9.81 * self.wing_box.material.density * integrate.quad(self.wing_box.calc_material_area, y, self.wing_box.end_y, epsabs=1.49e-06)[0]
+        return -9.81 * self.wing_box.material.density * self.wing_box.calc_material_area(y)
 
     def weight_wing(self, y):
-        return - 9.81 * 2.06 * 0.001 * self.wing_box.material.density * integrate.quad(self.load_case.wing.chord, y, self.wing_box.end_y)[0]
+        return - 9.81 * 2.06 * 0.001 * self.wing_box.material.density * self.load_case.wing.chord(y)
 
-    def engine(self, y):
-        if y <= self.load_case.wing.engine.y:
-            return - self.load_case.wing.engine.weight
-        else:
-            return 0
+    def engine_step(self):
+        return piecewise.step(self.wing_box.start_y, self.load_case.wing.engine.y, self.wing_box.end_y,
+                              - self.load_case.wing.engine.weight, 0.0)
 
+    @instrument.traced
     def calc_weight_wing_box(self):
-        return - self.weight_wing_box(0)
+        integrator = integration.SpanwiseIntegrator.from_load_case(self.load_case)
+        return - integrator.integrate(self.weight_wing_box, from_tip=True)(self.wing_box.start_y)
 
     def print_result(self, results):
         abs_min = abs(min(results))
@@ -98,16 +110,15 @@ class MomentCalculator:
         self.load_case = load_case
         self.shear = shear
 
-    def calc(self, size):
-        pool = Pool(size)
-        results = pool.map(self.value, self.load_case.range)
-        pool.close()
-        pool.join()
-        self.print_result(results)
-        return interpolate.interp1d(self.load_case.range, results, kind='cubic', fill_value="extrapolate")
+    @instrument.traced
+    def calc(self):
+        moment = self.calc_distribution()
+        self.print_result(moment(self.load_case.range))
+        return moment
 
-    def value(self, y):
-        return integrate.quad(self.shear, y, self.load_case.wing.wing_box.end_y, epsrel=1.49e-06)[0]
+    def calc_distribution(self):
+        # the shear is a piecewise polynomial, so its integral is exact
+        return integration.from_tip(self.shear.antiderivative(), self.load_case.wing.wing_box.end_y)
 
     def print_result(self, results):
         abs_min = abs(min(results))
@@ -122,19 +133,13 @@ class RotationCalculator:
         self.load_case = load_case
         self.moment = moment
 
-    def calc(self, size):
-        pool = Pool(size)
-        results = pool.map(self.value, self.load_case.range)
-        pool.close()
-        pool.join()
-        return interpolate.interp1d(self.load_case.range, results, kind='cubic', fill_value="extrapolate")
-
-    def value(self, y):
-        return self.rotation(y)
+    @instrument.traced
+    def calc(self):
+        return integration.SpanwiseIntegrator.from_load_case(self.load_case).integrate(self.curvature)
 
-    def rotation(self, y):
-        func = lambda y2: self.moment(y2) / self.load_case.wing.wing_box.calc_moi_xx(y2)
-        return integrate.quad(func, 0, y, limit=200, epsrel=1.49e-06)[0] / self.load_case.wing.wing_box.material.e_modulus
+    def curvature(self, y):
+        wing_box = self.load_case.wing.wing_box
+        return self.moment(y) / wing_box.calc_moi_xx(y) / wing_box.material.e_modulus
 
 
 class DeflectionCalculator:
@@ -143,19 +148,11 @@ class DeflectionCalculator:
         self.load_case = load_case
         self.rotation = rotation
 
-    def calc(self, size):
-        pool = Pool(size)
-        results = pool.map(self.value, self.load_case.range)
-        pool.close()
-        pool.join()
-        self.print_result(results)
-        return interpolate.interp1d(self.load_case.range, results, kind='cubic', fill_value="extrapolate")
-
-    def value(self, y):
-        return self.deflection(y)
-
-    def deflection(self, y):
-        return integrate.quad(self.rotation, 0, y, epsabs=1.49e-06)[0]
+    @instrument.traced
+    def calc(self):
+        deflection = self.rotation.antiderivative()  # zero at the root, where the rotation starts
+        self.print_result(deflection(self.load_case.range))
+        return deflection
 
     def print_result(self, results):
         deflection = results[-1] / (self.load_case.wing.wing_box.end_y * 2) * 100
@@ -169,26 +166,17 @@ class TorsionCalculator:
     def __init__(self, load_case):
         self.load_case = load_case
 
-    def calc(self, size):
-        pool = Pool(size)
-        results = pool.map(self.value, self.load_case.range)
-        pool.close()
-        pool.join()
-        self.print_result(results)
-        return interpolate.interp1d(self.load_case.range, results, kind='cubic', fill_value="extrapolate")
-
-    def value(self, y):
-        return self.lift_moment(y) + self.engine(y)
-
-    def lift_moment(self, y):
-        func = lambda y2: self.load_case.wing.moment(y2, self.load_case.density, self.load_case.velocity)
-        return integrate.quad(func, y, self.load_case.wing.wing_box.end_y)[0]
+    @instrument.traced
+    def calc(self):
+        wing_box = self.load_case.wing.wing_box
+        torsion = piecewise.add(self.load_case.wing.loads.moment_from_tip(wing_box.end_y), self.engine_step())
+        self.print_result(torsion(self.load_case.range))
+        return torsion
 
-    def engine(self, y):
-        if y <= self.load_case.wing.engine.y:
-            return self.load_case.wing.engine.thrust * self.load_case.wing.engine.z + self.load_case.wing.engine.weight * self.load_case.wing.engine.x
-        else:
-            return 0
+    def engine_step(self):
+        engine = self.load_case.wing.engine
+        wing_box = self.load_case.wing.wing_box
+        return piecewise.step(wing_box.start_y, engine.y, wing_box.end_y, engine.thrust * engine.z + engine.weight * engine.x, 0.0)
 
     def print_result(self, results):
         abs_min = abs(min(results))
@@ -203,20 +191,15 @@ class TwistCalculator:
         self.load_case = load_case
         self.torsion = torsion
 
-    def calc(self, size):
-        pool = Pool(size)
-        results = pool.map(self.value, self.load_case.range)
-        pool.close()
-        pool.join()
-        self.print_result(results)
-        return interpolate.interp1d(self.load_case.range, results, kind='cubic', fill_value="extrapolate")
-
-    def value(self, y):
-        return self.twist(y)
+    @instrument.traced
+    def calc(self):
+        twist = integration.SpanwiseIntegrator.from_load_case(self.load_case).integrate(self.twist_rate)
+        self.print_result(twist(self.load_case.range))
+        return twist
 
-    def twist(self, y):
-        return integrate.quad(lambda y2: self.torsion(y2) / self.load_case.wing.wing_box.calc_moi_polar(y2),
-                              0, y, limit=200)[0] / self.load_case.wing.wing_box.material.shear_modulus
+    def twist_rate(self, y):
+        wing_box = self.load_case.wing.wing_box
+        return self.torsion(y) / wing_box.calc_moi_polar(y) / wing_box.material.shear_modulus
 
     def print_result(self, results):
         twist = results[-1] * 180 / sp.pi
@@ -232,13 +215,11 @@ class TopPanelStressCalculator:
         self.wing_box = load_case.wing.wing_box
         self.moment = moment
 
-    def calc(self, size):
-        pool = Pool(size)
-        results = pool.map(self.value, self.load_case.range)
-        pool.close()
-        pool.join()
-        self.print_result(results)
-        return interpolate.interp1d(self.load_case.range, results, kind="cubic", fill_value="extrapolate")
+    @instrument.traced
+    def calc(self):
+        results = self.value(self.load_case.range)
+        self.print_result(list(results))
+        return piecewise.interpolate_sections(self.load_case.range, results, self.wing_box.sections)
 
     def value(self, y):
         return - self.moment(y) * (self.wing_box.calc_height(y) / 2 - self.wing_box.calc_centroid_z(y)) / \
@@ -248,7 +229,7 @@ class TopPanelStressCalculator:
         abs_min = abs(min(results))
         abs_max = abs(max(results))
         max_value = max(results) if abs_max > abs_min else min(results)
-        pos = results.index(max_value) * self.load_case.step
+        pos = self.load_case.range[results.index(max_value)]
         print("Maximum stress in top panel: {0:.3e} [Pa] at {1:.2f} [m]".format(max_value, pos))
         if max_value > self.wing_box.material.yield_stress:
             util.print_err("Wing box failed: top panel stress exceeded yield stress.")
@@ -261,13 +242,11 @@ class BottomPanelStressCalculator:
         self.wing_box = load_case.wing.wing_box
         self.moment = moment
 
-    def calc(self, size):
-        pool = Pool(size)
-        results = pool.map(self.value, self.load_case.range)
-        pool.close()
-        pool.join()
-        self.print_result(results)
-        return interpolate.interp1d(self.load_case.range, results, kind="cubic", fill_value="extrapolate")
+    @instrument.traced
+    def calc(self):
+        results = self.value(self.load_case.range)
+        self.print_result(list(results))
+        return piecewise.interpolate_sections(self.load_case.range, results, self.wing_box.sections)
 
     def value(self, y):
         return self.moment(y) * (self.wing_box.calc_height(y) / 2 + self.wing_box.calc_centroid_z(y)) / \
@@ -277,16 +256,27 @@ class BottomPanelStressCalculator:
         abs_min = abs(min(results))
         abs_max = abs(max(results))
         max_value = max(results) if abs_max > abs_min else min(results)
-        pos = results.index(max_value) * self.load_case.step
+        pos = self.load_case.range[results.index(max_value)]
         print("Maximum stress in bottom panel: {0:.3e} [Pa] at {1:.2f} [m]".format(max_value, pos))
         if max_value > self.wing_box.material.yield_stress:
             util.print_err("Wing box failed: bottom panel stress exceeded yield stress.")
 
 
+class WebBucklingResult(collections.namedtuple("WebBucklingResult", [
+        "margins", "stations", "front_spar_margins", "back_spar_margins"])):
+    # the lowest margin of both spars over the span, called like the other stage results, with the margins of each
+    # spar at the stations
+
+    __slots__ = ()
+
+    def __call__(self, y):
+        return self.margins(y)
+
+
 class WebBucklingCalculator:
 
-    ks_clamped = util.load_k("stress_coefficients/ks_clamped.txt")
-    ks_hinged = util.load_k("stress_coefficients/ks_hinged.txt")
+    ks_clamped = coefficients.ks_clamped
+    ks_hinged = coefficients.ks_hinged
 
     def __init__(self, load_case, shear, torsion):
         self.load_case = load_case
@@ -295,35 +285,47 @@ class WebBucklingCalculator:
         self.torsion = torsion
         self.shear_factor = self.calc_shear_factor()
 
-    def calc(self, size):
-        pool = Pool(size)
-        results = pool.map(self.value, self.load_case.range)
-        pool.close()
-        pool.join()
+    @instrument.traced
+    def calc(self):
+        y = self.load_case.range
+        front_crit_stress, back_crit_stress, shear_stress_max = self.calc_stresses(y)
+        # margins as magnitudes, the sign of the shear only gives its direction
+        front_margins = np.abs(front_crit_stress / shear_stress_max)
+        back_margins = np.abs(back_crit_stress / shear_stress_max)
+        # true where the lowest margin of safety is on the front spar
+        front_spar = front_crit_stress < back_crit_stress
+        min_values = np.where(front_spar, front_margins, back_margins)
+        indices = self.wing_box.get_section_indices(y)
         min_margin = {}
-        min_values = []
-        for section in self.wing_box.sections:
+        for i, section in enumerate(self.wing_box.sections):
             min_margin[section] = [sys.float_info.max, False]
-        for result in results:
-            if result is not None:
-                min_values.append(abs(result[1]))
-                if abs(result[1]) < min_margin[result[0]][0]:
-                    min_margin[result[0]][0] = abs(result[1])
-                    min_margin[result[0]][1] = result[2]
+            stations = np.flatnonzero(indices == i)
+            if len(stations) > 0:
+                governing = stations[np.argmin(min_values[stations])]
+                min_margin[section] = [min_values[governing], front_spar[governing]]
         self.print_result(min_margin)
-        return interpolate.interp1d(self.load_case.range, min_values, kind="cubic", fill_value="extrapolate")
-
-    def value(self, y):
-        section = self.wing_box.get_active_section(y)
-        shear_stress_avg = self.shear(y) / (self.wing_box.calc_height(y) * (section.front_spar_t + section.back_spar_t))
+        return WebBucklingResult(piecewise.interpolate_sections(y, min_values, self.wing_box.sections), y,
+                                 front_margins, back_margins)
+
+    def calc_stresses(self, y):
+        # critical stresses of the front and back spar and the maximum shear stress at the stations y
+        y = np.asarray(y, dtype=float)
+        sections = self.wing_box.sections
+        indices = self.wing_box.get_section_indices(y)
+        front_spar_t = np.array([section.front_spar_t for section in sections])[indices]
+        back_spar_t = np.array([section.back_spar_t for section in sections])[indices]
+        length = np.array([section.end_y - section.start_y for section in sections])[indices]
+        height = self.wing_box.calc_height(y)
+        shear_stress_avg = self.shear(y) / (height * (front_spar_t + back_spar_t))
         shear_stress_max = shear_stress_avg * self.shear_factor
-        length = section.end_y - section.start_y
-        width = self.wing_box.calc_height(y)
+        # shear flow of the torsion, adding to the shear of the back spar and subtracting from the front spar
         q = self.torsion(y) / (2 * self.wing_box.calc_area_cross_sectional(y))
-        crit_stress = [self.critical_stress(section.front_spar_t, length, width) - q / section.front_spar_t, self.critical_stress(section.back_spar_t, length, width) + q / section.back_spar_t]
-        return [section, min(crit_stress) / shear_stress_max, crit_stress[0] < crit_stress[1]] # true when lowest safety margin on front spar
+        front_crit_stress = self.critical_stress(front_spar_t, length, height) - q / front_spar_t
+        back_crit_stress = self.critical_stress(back_spar_t, length, height) + q / back_spar_t
+        return front_crit_stress, back_crit_stress, shear_stress_max
 
     def max_centroid(self, y):
+        # first moment of the area above the neutral axis divided by that area, at the station y
         wing_box_section = self.wing_box.get_active_section(y)
         height = self.wing_box.calc_height(y) / 2 - self.wing_box.calc_centroid_z(y)
         a = self.wing_box.calc_width(y) * wing_box_section.top_panel_t
@@ -333,22 +335,18 @@ class WebBucklingCalculator:
         a += area
         az += area * height / 2
 
-        for stringer_set in wing_box_section.stringer_sets:
-            if stringer_set.surface_top:
-                z = height - wing_box_section.top_panel_t - stringer_set.calc_centroid_z()
-                area = stringer_set.calc_area()
-                a += area
-                az += area * z
+        top_sets = [stringer_set for stringer_set in wing_box_section.stringer_sets if stringer_set.surface_top]
+        areas = np.array([stringer_set.calc_area() for stringer_set in top_sets])
+        z = height - wing_box_section.top_panel_t - np.array([stringer_set.calc_centroid_z() for stringer_set in top_sets])
+        a += np.sum(areas)
+        az += np.sum(areas * z)
         return az / a
 
     def calc_shear_factor(self):
-        v_max = 0
-        y = 0
-        for step in self.load_case.range:
-            v = abs(self.shear(step))
-            if v > v_max:
-                v_max = v
-                y = step
+        shear = np.abs(self.shear(self.load_case.range))
+        peak = np.argmax(shear)
+        v_max = shear[peak]
+        y = self.load_case.range[peak]
         section = self.wing_box.get_active_section(y)
         shear_stress_avg = v_max / (self.wing_box.calc_height(y) * (section.front_spar_t + section.back_spar_t))
         shear_stress_max = v_max * self.max_centroid(y) / (self.wing_box.calc_moi_xx(y) * (section.front_spar_t + section.back_spar_t))
@@ -370,8 +368,8 @@ class WebBucklingCalculator:
 
 class SkinBucklingCalculator:
 
-    kc_b = util.load_k("stress_coefficients/kc_B.txt")
-    kc_c = util.load_k("stress_coefficients/kc_C.txt")
+    kc_b = coefficients.kc_b
+    kc_c = coefficients.kc_c
 
     def __init__(self, load_case, top_panel_stress, bottom_panel_stress):
         self.load_case = load_case
@@ -379,40 +377,46 @@ class SkinBucklingCalculator:
         self.top_panel_stress = top_panel_stress
         self.bottom_panel_stress = bottom_panel_stress
 
-    def calc(self, size):
-        pool = Pool(size)
-        results = []
-        for plate in self.find_plates():
-            results.append(pool.map(partial(self.value, plate=plate), self.load_case.range))
-        pool.close()
-        pool.join()
+    @instrument.traced
+    def calc(self):
+        plates = self.find_plates()
+        margins = self.calc_margins(self.load_case.range, plates)
+        # only positive margins count, the plates in tension do not buckle
+        margins = np.where(margins > 0, margins, sys.float_info.max)
+        min_values = np.min(margins, axis=0) if len(plates) > 0 else np.full(len(self.load_case.range), sys.float_info.max)
+        plate_margins = np.min(margins, axis=1)
         min_margin = {}
-        min_values = [sys.float_info.max]*len(self.load_case.range)
-        for section in self.wing_box.sections:
+        plate_sections = self.find_plate_sections(plates)
+        for i, section in enumerate(self.wing_box.sections):
             min_margin[section] = [sys.float_info.max, None]
-        for results_set in results:
-            for i in range(len(results_set)):
-                if results_set[i] is not None:
-                    if 0 < results_set[i][1] < min_values[i]:
-                        min_values[i] = results_set[i][1]
-                    if 0 < results_set[i][1] < min_margin[results_set[i][0]][0]:
-                        min_margin[results_set[i][0]][0] = results_set[i][1]
-                        min_margin[results_set[i][0]][1] = results_set[i][2]
+            indices = np.flatnonzero((plate_sections == i) & (plate_margins < sys.float_info.max))
+            if len(indices) > 0:
+                governing = indices[np.argmin(plate_margins[indices])]
+                min_margin[section] = [plate_margins[governing], plates[governing]]
         self.print_result(min_margin)
-        return interpolate.interp1d(self.load_case.range, min_values, kind="cubic", fill_value="extrapolate")
-
-    def value(self, y, plate):
-        if plate.start_y <= y <= plate.end_y:
-            stress_max = self.top_panel_stress(y) if plate.surface_top else self.bottom_panel_stress(y)
-            length = plate.end_y - plate.start_y
-            width = plate.width * self.wing_box.calc_width(y)
-            ratio = length / width
-            if ratio > 5: ratio = 5
-            k = self.kc_b(ratio) if plate.side else self.kc_c(ratio)
-            stress_crit = - self.critical_stress(k, plate.thickness, width)
-            return [self.wing_box.get_active_section(y), stress_crit / stress_max, plate]
-        else:
-            return None
+        return piecewise.interpolate_sections(self.load_case.range, min_values, self.wing_box.sections)
+
+    def calc_margins(self, y, plates):
+        # margins of every plate (rows) at every station (columns), NaN at the stations outside the section of a plate
+        y = np.asarray(y, dtype=float)
+        plate_sections = self.find_plate_sections(plates)
+        thickness = np.array([plate.thickness for plate in plates])[:, None]
+        length = np.array([plate.end_y - plate.start_y for plate in plates])[:, None]
+        side = np.array([plate.side for plate in plates], dtype=bool)[:, None]
+        surface_top = np.array([plate.surface_top for plate in plates], dtype=bool)[:, None]
+        width = np.array([plate.width for plate in plates])[:, None] * self.wing_box.calc_width(y)
+        stress_max = np.where(surface_top, self.top_panel_stress(y), self.bottom_panel_stress(y))
+        ratio = np.minimum(length / width, 5)
+        k = np.where(side, self.kc_b(ratio), self.kc_c(ratio))
+        stress_crit = - self.critical_stress(k, thickness, width)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            margins = stress_crit / stress_max
+        # a station on a joint belongs to the inboard section only, not to the plates of both
+        return np.where(plate_sections[:, None] == self.wing_box.get_section_indices(y), margins, np.nan)
+
+    def find_plate_sections(self, plates):
+        starts = [section.start_y for section in self.wing_box.sections]
+        return np.searchsorted(starts, [plate.start_y for plate in plates])
 
     def find_plates(self):
         plates = []
@@ -453,6 +457,9 @@ class SkinBucklingCalculator:
         failure = False
         for section in self.wing_box.sections:
             if min_margin[section][0] < 1: failure = True
+            if min_margin[section][1] is None:
+                print("Wing box section range: {0:.2f}, {1:.2f} [m]; No compressed plates".format(section.start_y, section.end_y))
+                continue
             print("Wing box section range: {0:.2f}, {1:.2f} [m]; Lowest margin of safety: {2:.2f} on plate with width {3:.2f} [m]".format(section.start_y, section.end_y, min_margin[section][0], min_margin[section][1].width))
         if failure: util.print_err("Wing box failed due to skin buckling")
 
@@ -464,46 +471,46 @@ class ColumnBucklingCalculator:
         self.load_case = load_case
         self.wing_box = load_case.wing.wing_box
 
-    def calc(self, size):
-        pool = Pool(size)
-        results = []
-        for section in self.wing_box.sections:
-            for stringer_set in section.stringer_sets:
-                results.append(pool.map(partial(self.value, section=section, stringer_set=stringer_set), self.load_case.range))
-        pool.close()
-        pool.join()
+    @instrument.traced
+    def calc(self):
+        y = self.load_case.range
+        indices = self.wing_box.get_section_indices(y)
         min_margin = {}
-        min_values = [sys.float_info.max]*len(self.load_case.range)
-        for section in self.wing_box.sections:
+        min_values = np.full(len(y), sys.float_info.max)
+        for i, section in enumerate(self.wing_box.sections):
             min_margin[section] = [sys.float_info.max, None]
-        for results_set in results:
-            for i in range(len(results_set)):
-                if results_set[i] is not None:
-                    if 0 < results_set[i][1] < min_values[i]:
-                        min_values[i] = results_set[i][1]
-                    if 0 < results_set[i][1] < min_margin[results_set[i][0]][0]:
-                        min_margin[results_set[i][0]][0] = results_set[i][1]
-                        min_margin[results_set[i][0]][1] = results_set[i][2]
+            mask = indices == i
+            if not np.any(mask) or len(section.stringer_sets) == 0:
+                continue
+            margins = self.calc_margins(y[mask], section)
+            # only positive margins count, the stringers in tension do not buckle
+            margins = np.where(margins > 0, margins, sys.float_info.max)
+            min_values[mask] = np.min(margins, axis=0)
+            set_margins = np.min(margins, axis=1)
+            governing = np.argmin(set_margins)
+            if set_margins[governing] < sys.float_info.max:
+                min_margin[section] = [set_margins[governing], section.stringer_sets[governing]]
         self.print_result(min_margin)
-        return interpolate.interp1d(self.load_case.range, min_values, kind="cubic", fill_value="extrapolate")
-
-    def value(self, y, section, stringer_set):
-        if section.start_y <= y <= section.end_y:
-            height = self.wing_box.calc_height(y)
-            centroid_z = self.wing_box.calc_centroid_z(y)
-            z = height / 2 - stringer_set.calc_centroid_z()
-            if stringer_set.surface_top:
-                z -= centroid_z
-                z = -z
-            else:
-                z += centroid_z
-            max_stress = self.moment(y) * z / self.wing_box.calc_moi_xx(y)
-            crit_stress = - stringer_set.amount * self.critical_load(section.end_y - section.start_y,
-                                stringer_set.calc_moi_xx_parallel_axis(height, centroid_z)) / stringer_set.calc_area()
-            return [section, crit_stress / max_stress, stringer_set]
-        else:
-            return None
-
+        return piecewise.interpolate_sections(self.load_case.range, min_values, self.wing_box.sections)
+
+    def calc_margins(self, y, section):
+        # margins of every stringer set of the section (rows) at the stations y inside it (columns)
+        stringer_sets = section.stringer_sets
+        amount = np.array([stringer_set.amount for stringer_set in stringer_sets])[:, None]
+        area = np.array([stringer_set.calc_area() for stringer_set in stringer_sets])[:, None]
+        moi_xx = np.array([stringer_set.calc_moi_xx() for stringer_set in stringer_sets])[:, None]
+        stringer_centroid_z = np.array([stringer_set.calc_centroid_z() for stringer_set in stringer_sets])[:, None]
+        surface_top = np.array([stringer_set.surface_top for stringer_set in stringer_sets], dtype=bool)[:, None]
+        height = self.wing_box.calc_height(y)
+        centroid_z = self.wing_box.calc_centroid_z(y)
+        z = height / 2 - stringer_centroid_z
+        z = np.where(surface_top, centroid_z - z, z + centroid_z)
+        max_stress = self.moment(y) * z / self.wing_box.calc_moi_xx(y)
+        # StringerSet.calc_moi_xx_parallel_axis
+        moi = moi_xx + area * (stringer_centroid_z - centroid_z) ** 2
+        crit_stress = - amount * self.critical_load(section.end_y - section.start_y, moi) / area
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return crit_stress / max_stress
 
     def critical_load(self, length, moi):
         k = 1  # = 1 if both ends are pinned, 4 if both ends are clamped, 1/4 if one end is fixes and one end is free;
@@ -516,5 +523,8 @@ class ColumnBucklingCalculator:
         failure = False
         for section in self.wing_box.sections:
             if min_margin[section][0] < 1: failure = True
+            if min_margin[section][1] is None:
+                print("Wing box section range: {0:.2f}, {1:.2f} [m]; No compressed stringers".format(section.start_y, section.end_y))
+                continue
             print("Wing box section range: {0:.2f}, {1:.2f} [m]; Lowest margin of safety: {2:.2f} on {3} set with size {4}, {5} [m]".format(section.start_y, section.end_y, min_margin[section][0], min_margin[section][1].stringer_type.name, min_margin[section][1].stringer_width, min_margin[section][1].stringer_height))
         if failure: util.print_err("Wing box failed due to column buckling")
@@ -0,0 +1,221 @@
+import argparse
+import contextlib
+import copy
+import io
+import json
+import multiprocessing
+import platform
+import time
+import tracemalloc
+
+import numpy as np
+import scipy
+
+import analyze
+import explore
+import integration
+import main
+import parse
+import population
+
+
+class Benchmark:
+
+    def __init__(self, load_case, wing_box_name, repeat=3, memory=True, min_time=0.2):
+        self.load_case = load_case
+        self.wing_box_name = wing_box_name
+        self.repeat = repeat
+        self.memory = memory
+        self.min_time = min_time  # [s] runs of a measurement add up to at least this, so short ones are not timer noise
+        self.records = []
+
+    def measure(self, name, func, workers=1, memory=None):
+        # the fastest of at least repeat runs adding up to min_time, so short calculators are not timed on timer
+        # noise; the peak memory is traced on a separate first run, as tracing slows down the run
+        memory = self.memory if memory is None else memory
+        peak_memory = 0
+        if memory:
+            tracemalloc.start()
+            with contextlib.redirect_stdout(io.StringIO()):
+                func()
+            peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        best = None
+        runs = 0
+        total_wall = 0
+        while runs < self.repeat or total_wall < self.min_time:
+            evaluations = integration.SpanwiseIntegrator.total_evaluations
+            wall = time.perf_counter()
+            cpu = time.process_time()
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = func()
+            cpu = time.process_time() - cpu
+            wall = time.perf_counter() - wall
+            evaluations = integration.SpanwiseIntegrator.total_evaluations - evaluations
+            runs += 1
+            total_wall += wall
+            if best is None or wall < best[0]:
+                best = wall, cpu, evaluations
+        self.records.append({
+            "wing_box": self.wing_box_name,
+            "step": self.load_case.step,
+            "stations": len(self.load_case.range),
+            "calculator": name,
+            "workers": workers,
+            "runs": runs,
+            "wall_time": best[0],
+            "cpu_time": best[1],
+            "peak_memory": peak_memory,
+            "integrand_evaluations": best[2],
+        })
+        return result
+
+    def run_calculators(self):
+        load_case = self.load_case
+        wing_box = load_case.wing.wing_box
+
+        def moi_xx():
+            wing_box.reset_properties()
+            return analyze.MoIXXCalculator(load_case).calc()
+
+        def moi_polar():
+            wing_box.reset_properties()
+            return analyze.MoIPolarCalculator(load_case).calc()
+
+        self.measure("MoIXXCalculator", moi_xx)
+        self.measure("MoIPolarCalculator", moi_polar)
+        shear = self.measure("ShearCalculator", lambda: analyze.ShearCalculator(load_case).calc())
+        moment = self.measure("MomentCalculator", lambda: analyze.MomentCalculator(load_case, shear).calc())
+        rotation = self.measure("RotationCalculator", lambda: analyze.RotationCalculator(load_case, moment).calc())
+        self.measure("DeflectionCalculator", lambda: analyze.DeflectionCalculator(load_case, rotation).calc())
+        torsion = self.measure("TorsionCalculator", lambda: analyze.TorsionCalculator(load_case).calc())
+        self.measure("TwistCalculator", lambda: analyze.TwistCalculator(load_case, torsion).calc())
+        top = self.measure("TopPanelStressCalculator", lambda: analyze.TopPanelStressCalculator(load_case, moment).calc())
+        bottom = self.measure("BottomPanelStressCalculator", lambda: analyze.BottomPanelStressCalculator(load_case, moment).calc())
+        self.measure("WebBucklingCalculator", lambda: analyze.WebBucklingCalculator(load_case, shear, torsion).calc())
+        self.measure("SkinBucklingCalculator", lambda: analyze.SkinBucklingCalculator(load_case, top, bottom).calc())
+        self.measure("ColumnBucklingCalculator", lambda: analyze.ColumnBucklingCalculator(load_case, moment).calc())
+
+    def run_pipeline(self, threads=main.DataCalculator.threads):
+        def pipeline():
+            self.load_case.wing.wing_box.reset_properties()
+            calculator = main.DataCalculator(self.load_case, False, threads=threads)
+            calculator.analyze("deflection", "twist", "stress")
+
+        self.measure("DataCalculator", pipeline, threads)
+
+    def run_exploration(self, processes, variants=16):
+        # variants of the wing box evaluated by the processes of an exploration pool, started before the timing
+        pool = explore.ExplorationPool([self.load_case], processes)
+        population_variants = population.WingBoxPopulation.repeat(self.load_case.wing.wing_box, variants)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                pool.start()
+            self.measure("ExplorationPool", lambda: pool.evaluate(population_variants), processes, False)
+        finally:
+            pool.close()
+
+
+def load_benchmark_case(load_case_name, wing_box_name, step):
+    load_case = parse.load_load_case(load_case_name)
+    # the wing of the load case gets its own wing box (and fuel tank pointing at it)
+    load_case.wing = copy.copy(load_case.wing)
+    load_case.wing.wing_box = parse.load_wing_box(wing_box_name)
+    load_case.wing.fuel_tank = copy.copy(load_case.wing.fuel_tank)
+    load_case.wing.fuel_tank.wing_box = load_case.wing.wing_box
+    load_case.step = step
+    load_case.range = load_case.calc_range()
+    return load_case
+
+
+def calc_scaling(records, calculator):
+    # exponent of the wall time against the number of stations, from a least squares fit in log space, with one worker
+    workers = min(record["workers"] for record in records if record["calculator"] == calculator)
+    points = [(record["stations"], record["wall_time"]) for record in records
+              if record["calculator"] == calculator and record["workers"] == workers and record["wall_time"] > 0]
+    if len(set(point[0] for point in points)) < 2:
+        return None
+    stations, wall_time = np.log(np.array(points)).T
+    return np.polyfit(stations, wall_time, 1)[0]
+
+
+def calc_speedups(records, calculator):
+    # wall time of the fewest workers over that of every number of workers, on the most stations measured
+    selected = [record for record in records if record["calculator"] == calculator]
+    stations = max(record["stations"] for record in selected)
+    times = {}
+    for record in selected:
+        if record["stations"] == stations:
+            times.setdefault(record["workers"], []).append(record["wall_time"])
+    times = {workers: np.mean(values) for workers, values in sorted(times.items())}
+    base = times[min(times)]
+    return stations, {workers: base / wall_time for workers, wall_time in times.items()}
+
+
+def parse_arguments(args=None):
+    parser = argparse.ArgumentParser(description="Benchmark the calculators of analyze.py and the full pipeline.")
+    parser.add_argument("--load-case", default="n-positive", help="load case in loadcases/")
+    parser.add_argument("--wing-boxes", nargs="+", default=["TUD-A05", "TUD-A05-2", "TUD-A05-3"], help="wing boxes in wingboxes/")
+    parser.add_argument("--steps", nargs="+", type=float, default=[0.1, 0.05, 0.02, 0.01, 0.005], help="station spacings [m]")
+    parser.add_argument("--pool-sizes", nargs="+", type=int, default=sorted({1, multiprocessing.cpu_count()}),
+                        help="numbers of workers: stage threads of the pipeline and processes of the exploration pool")
+    parser.add_argument("--variants", type=int, default=16, help="wing box variants evaluated by the exploration pool")
+    parser.add_argument("--repeat", type=int, default=3, help="minimum runs per measurement, the fastest is kept")
+    parser.add_argument("--min-time", type=float, default=0.2, help="minimum total time of the runs of a measurement [s]")
+    parser.add_argument("--no-memory", action="store_true", help="skip tracing the peak memory, which slows down the runs")
+    parser.add_argument("--output", default="benchmark.json", help="file to write the results to")
+    return parser.parse_args(args)
+
+
+def run(args):
+    records = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        load_cases = {(name, step): load_benchmark_case(args.load_case, name, step) for name in args.wing_boxes for step in args.steps}
+    for (wing_box_name, step), load_case in load_cases.items():
+        benchmark = Benchmark(load_case, wing_box_name, args.repeat, not args.no_memory, args.min_time)
+        benchmark.run_calculators()
+        for pool_size in args.pool_sizes:
+            benchmark.run_pipeline(pool_size)
+            print("{0}, step {1} [m], {2} stations, {3} threads: pipeline {4:.3f} [s]".format(
+                wing_box_name, step, len(load_case.range), pool_size, benchmark.records[-1]["wall_time"]))
+        # every variant runs the whole pipeline, so the exploration is timed on the coarsest stations only
+        if step == max(args.steps):
+            for pool_size in args.pool_sizes:
+                benchmark.run_exploration(pool_size, args.variants)
+                print("{0}, step {1} [m], {2} processes: {3} variants explored in {4:.3f} [s]".format(
+                    wing_box_name, step, pool_size, args.variants, benchmark.records[-1]["wall_time"]))
+        records.extend(benchmark.records)
+
+    print("")
+    print("{0:<28}{1:>12}{2:>12}{3:>16}{4:>12}".format("Calculator", "Wall [s]", "CPU [s]", "Evaluations", "Scaling"))
+    for calculator in dict.fromkeys(record["calculator"] for record in records):
+        selected = [record for record in records if record["calculator"] == calculator]
+        largest = max(selected, key=lambda record: (record["stations"], -record["wall_time"]))
+        scaling = calc_scaling(selected, calculator)
+        print("{0:<28}{1:>12.4f}{2:>12.4f}{3:>16d}{4:>12}".format(calculator, largest["wall_time"], largest["cpu_time"],
+              largest["integrand_evaluations"], "-" if scaling is None else "N^%.2f" % scaling))
+
+    print("")
+    print("{0:<28}{1:>12}{2:>12}{3:>12}".format("Speedup", "Stations", "Workers", "Speedup"))
+    for calculator in ["DataCalculator", "ExplorationPool"]:
+        stations, speedups = calc_speedups(records, calculator)
+        for workers, speedup in speedups.items():
+            print("{0:<28}{1:>12d}{2:>12d}{3:>12.2f}".format(calculator, stations, workers, speedup))
+
+    environment = {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "scipy": scipy.__version__,
+        "platform": platform.platform(),
+        "cpu_count": multiprocessing.cpu_count(),
+        "load_case": args.load_case,
+    }
+    f = open(args.output, "w")
+    json.dump({"environment": environment, "records": records}, f, indent=2)
+    f.close()
+    print("")
+    print("Results written to %s" % args.output)
+
+
+if __name__ == '__main__':
+    run(parse_arguments())
@@ -0,0 +1,138 @@
+import hashlib
+import os
+import pickle
+
+import numpy as np
+
+
+# bumped whenever the layout of the cache entries changes; the keys also take the source of the modules that compute
+# the stages (see code_version), so a change to a formula never replays the numbers of the old one
+CACHE_VERSION = 2
+
+
+def code_version(*modules):
+    sha = hashlib.sha256(b"%d" % CACHE_VERSION)
+    for module in modules:
+        f = open(module.__file__, "rb")
+        sha.update(f.read())
+        f.close()
+    return sha.hexdigest()
+
+
+def digest(*inputs):
+    sha = hashlib.sha256()
+    update_digest(sha, inputs)
+    return sha.hexdigest()
+
+
+def update_digest(sha, value):
+    if isinstance(value, (tuple, list)):
+        sha.update(b"(%d" % len(value))
+        for item in value:
+            update_digest(sha, item)
+        sha.update(b")")
+    elif isinstance(value, np.ndarray):
+        sha.update(b"array%s%s" % (str(value.dtype).encode(), str(value.shape).encode()))
+        sha.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, np.generic):
+        update_digest(sha, value.item())
+    elif isinstance(value, (bool, int, float, str, type(None))):
+        sha.update(("%s:%r" % (type(value).__name__, value)).encode())
+    else:
+        raise TypeError("Can not use %s as cache input" % type(value).__name__)
+
+
+class MemoryCache:
+    # ResultCache that only lives as long as the process, for runs sharing stages without touching the disk
+
+    def __init__(self):
+        self.values = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, func):
+        if key in self.values:
+            self.hits += 1
+            return self.values[key]
+        self.misses += 1
+        value = func()
+        self.values[key] = value
+        return value
+
+
+class ResultCache:
+    # entries hold the version they were written with, one of another version is a miss
+
+    def __init__(self, directory=".cache", max_size=256e6, version=CACHE_VERSION):
+        self.directory = directory
+        self.max_size = max_size  # [bytes]
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ".pkl")
+
+    def get(self, key, func):
+        path = self.path(key)
+        try:
+            f = open(path, "rb")
+            version, value = pickle.load(f)
+            f.close()
+            if version == self.version:
+                os.utime(path)  # the modification time marks when an entry was last used
+                self.hits += 1
+                return value
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError, TypeError):
+            pass
+        self.misses += 1
+        value = func()
+        self.put(key, value)
+        return value
+
+    def put(self, key, value):
+        path = self.path(key)
+        temp_path = "%s.%d.tmp" % (path, os.getpid())
+        f = open(temp_path, "wb")
+        pickle.dump((self.version, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.close()
+        os.replace(temp_path, path)
+        self.evict()
+
+    def entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".pkl"):
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                    entries.append((stat.st_mtime, stat.st_size, name))
+                except OSError:
+                    pass
+        return entries
+
+    def calc_size(self):
+        return sum(entry[1] for entry in self.entries())
+
+    def evict(self):
+        entries = sorted(self.entries())
+        size = sum(entry[1] for entry in entries)
+        while size > self.max_size and len(entries) > 1:
+            mtime, entry_size, name = entries.pop(0)
+            try:
+                os.remove(os.path.join(self.directory, name))
+                self.evictions += 1
+            except OSError:
+                pass
+            size -= entry_size
+
+    def clear(self):
+        for entry in self.entries():
+            os.remove(os.path.join(self.directory, entry[2]))
+
+    def print_result(self):
+        print("")
+        print("Result cache in {0}".format(self.directory))
+        print("Hits: {0}; misses: {1}; evictions: {2}; size: {3:.1f} of {4:.1f} [MB]".format(
+            self.hits, self.misses, self.evictions, self.calc_size() / 1e6, self.max_size / 1e6))
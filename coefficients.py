@@ -0,0 +1,71 @@
+import hashlib
+import threading
+
+import numpy as np
+from scipy import interpolate
+
+
+class CoefficientTable:
+    # buckling coefficient against the aspect ratio of a plate, digitized from a chart; read on first use and kept as
+    # a dense uniform table, so a lookup is an index computation and a linear interpolation for any array of ratios
+
+    size = 4096  # points of the table over the digitized range
+
+    def __init__(self, path, size=size):
+        self.path = path
+        self.size = size
+        self.table = None  # (start, step, values), built on the first lookup
+        self.content = None  # hash of the digitized points, read with the table
+        self.lock = threading.Lock()  # the buckling stages may run side by side
+
+    def load(self):
+        with self.lock:
+            if self.table is None:
+                ratios, values = self.read()
+                self.content = hashlib.sha256(ratios.tobytes() + values.tobytes()).hexdigest()
+                self.table = self.build(ratios, values)
+        return self.table
+
+    def read(self):
+        points = np.loadtxt(self.path, delimiter=",", ndmin=2)
+        # digitized points come in any order and may repeat a ratio, those are averaged
+        ratios, inverse = np.unique(points[:, 0], return_inverse=True)
+        values = np.bincount(inverse, weights=points[:, 1]) / np.bincount(inverse)
+        return ratios, values
+
+    def build(self, ratios, values):
+        # the cubic spline through the points, sampled once
+        kind = "cubic" if len(ratios) > 3 else "linear"
+        spline = interpolate.interp1d(ratios, values, kind=kind, assume_sorted=True)
+        grid = np.linspace(ratios[0], ratios[-1], self.size)
+        return ratios[0], grid[1] - grid[0], spline(grid)
+
+    def key(self):
+        if self.table is None:
+            self.load()
+        return self.path, self.size, self.content
+
+    def __call__(self, ratio):
+        start, step, values = self.table if self.table is not None else self.load()
+        ratio = np.asarray(ratio, dtype=float)
+        finite = np.isfinite(ratio)
+        # outside the digitized range the coefficient is held at its end value rather than extrapolated
+        position = np.clip((np.where(finite, ratio, start) - start) / step, 0, len(values) - 1)
+        index = np.minimum(position.astype(int), len(values) - 2)
+        fraction = position - index
+        # a ratio that is not a number, e.g. of a plate without height, has no coefficient
+        result = np.where(finite, values[index] * (1 - fraction) + values[index + 1] * fraction, np.nan)
+        return float(result) if np.ndim(result) == 0 else result
+
+    def __getstate__(self):
+        # sent to the workers as the path, each loads the table when it first needs it
+        return {"path": self.path, "size": self.size}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"], state["size"])
+
+
+ks_clamped = CoefficientTable("stress_coefficients/ks_clamped.txt")
+ks_hinged = CoefficientTable("stress_coefficients/ks_hinged.txt")
+kc_b = CoefficientTable("stress_coefficients/kc_B.txt")
+kc_c = CoefficientTable("stress_coefficients/kc_C.txt")
@@ -0,0 +1,174 @@
+import argparse
+import contextlib
+import copy
+import io
+import math
+import time
+
+import numpy as np
+
+import cache
+import main
+import parse
+
+
+class ConvergenceStudy:
+
+    quantities = ["tip_deflection", "tip_twist", "max_panel_stress", "min_shear_margin", "min_skin_margin",
+                  "min_column_margin"]
+    # extrema over the stations of a level move with where the stations fall (and the margins across zero), they have
+    # no order of convergence to extrapolate with
+    not_extrapolable = ["max_panel_stress", "min_shear_margin", "min_skin_margin", "min_column_margin"]
+
+    def __init__(self, load_case, step=None, tolerance=1e-3, max_levels=6, result_cache=None,
+                 threads=main.DataCalculator.threads):
+        self.load_case = load_case
+        self.step = step if step is not None else load_case.step
+        self.tolerance = tolerance  # relative error of every quantity to stop at
+        self.max_levels = max_levels
+        self.threads = threads  # stages of a level computed side by side
+        # stages that do not depend on the stations (section properties, aerodynamic shear) are shared
+        self.result_cache = result_cache if result_cache is not None else cache.MemoryCache()
+
+    def create_load_cases(self):
+        # every level halves the step, so its stations include all of the coarser levels
+        load_cases = []
+        for level in range(self.max_levels):
+            load_case = copy.copy(self.load_case)
+            load_case.step = self.step / 2 ** level
+            load_case.tolerance = None
+            load_case.range = load_case.calc_range()
+            load_case.name = "%s[step=%g]" % (self.load_case.name, load_case.step)
+            load_cases.append(load_case)
+        return load_cases
+
+    def run(self):
+        load_cases = self.create_load_cases()
+        result = ConvergenceResult(self.tolerance)
+        for load_case in load_cases:
+            start = time.perf_counter()
+            calculator = main.DataCalculator(load_case, False, self.result_cache, self.threads)
+            with contextlib.redirect_stdout(io.StringIO()):
+                calculator.analyze("deflection", "twist", "stress")
+            result.add_level(load_case, self.calc_quantities(calculator), time.perf_counter() - start)
+            result.print_level()
+            if result.is_converged():
+                break
+        return result
+
+    def calc_quantities(self, calculator):
+        # the extrema are taken over the stations of the level itself, finer levels find the ones between the stations
+        # of coarser levels
+        stations = calculator.load_case.range
+        tip = calculator.load_case.wing.wing_box.end_y
+        stress = np.concatenate((calculator.top_panel_stress(stations), calculator.bottom_panel_stress(stations)))
+        return {
+            "tip_deflection": float(calculator.deflection(tip)),
+            "tip_twist": float(np.degrees(calculator.twist(tip))),
+            "max_panel_stress": float(np.max(np.abs(stress))),
+            "min_shear_margin": calc_min_margin(calculator.shear_buckling(stations)),
+            "min_skin_margin": calc_min_margin(calculator.skin_buckling(stations)),
+            "min_column_margin": calc_min_margin(calculator.column_buckling(stations)),
+        }
+
+
+class ConvergenceResult:
+
+    def __init__(self, tolerance):
+        self.tolerance = tolerance
+        self.steps = []
+        self.stations = []
+        self.times = []
+        self.values = {name: [] for name in ConvergenceStudy.quantities}
+
+    def add_level(self, load_case, quantities, wall_time):
+        self.steps.append(load_case.step)
+        self.stations.append(len(load_case.range))
+        self.times.append(wall_time)
+        for name in ConvergenceStudy.quantities:
+            self.values[name].append(quantities[name])
+
+    def extrapolate(self, name):
+        if name in ConvergenceStudy.not_extrapolable:
+            return last_changes(self.values[name])
+        return extrapolate(self.values[name])
+
+    def calc_relative_error(self, name):
+        estimate, order, error = self.extrapolate(name)
+        return error / abs(estimate) if estimate != 0 else error
+
+    def is_converged(self):
+        return len(self.steps) >= 3 and all(self.calc_relative_error(name) < self.tolerance for name in self.values)
+
+    def print_level(self):
+        level = len(self.steps) - 1
+        line = "Step {0:.4g} [m], {1} stations, {2:.2f} [s]".format(self.steps[level], self.stations[level], self.times[level])
+        if level > 0:
+            line += "; largest relative error: {0:.1e}".format(max(self.calc_relative_error(name) for name in self.values))
+        print(line)
+
+    def print_result(self):
+        print("")
+        print("Convergence {0} after {1} levels, tolerance {2:.1e}".format(
+            "reached" if self.is_converged() else "NOT reached", len(self.steps), self.tolerance))
+        print("{0:<20}{1:>15}{2:>15}{3:>10}{4:>12}".format("Quantity", "Finest", "Extrapolated", "Order", "Error"))
+        for name in self.values:
+            estimate, order, error = self.extrapolate(name)
+            print("{0:<20}{1:>15.6e}{2:>15.6e}{3:>10}{4:>12.1e}".format(
+                name, self.values[name][-1], estimate, "-" if order is None else "%.2f" % order, self.calc_relative_error(name)))
+
+
+def calc_min_margin(margins):
+    # stations without a positive margin (tension, see the buckling calculators) do not count
+    margins = margins[margins > 0]
+    return float(np.min(margins)) if len(margins) > 0 else math.inf
+
+
+def extrapolate(values, ratio=2):
+    # Richardson extrapolation from the last three levels, each refined by ratio: the estimate, the observed order of
+    # convergence and the error left in the finest level
+    if len(values) < 2:
+        return values[-1], None, math.inf
+    difference = values[-1] - values[-2]
+    if difference == 0:
+        return values[-1], None, 0.0
+    if len(values) < 3 or (values[-2] - values[-3]) / difference <= 1:
+        # without three levels that converge monotonically the last change is all there is
+        return values[-1], None, abs(difference)
+    order = math.log((values[-2] - values[-3]) / difference, ratio)
+    correction = difference / (ratio ** order - 1)
+    return values[-1] + correction, order, abs(correction)
+
+
+def last_changes(values):
+    # the finest level with the largest of its last two changes as its error, so a quantity only converges once it
+    # stops moving rather than by one small step
+    if len(values) < 3:
+        return values[-1], None, math.inf
+    # a margin without compressed stations stays infinite, which is no change
+    changes = [0.0 if a == b else abs(a - b) for a, b in zip(values[-3:-1], values[-2:])]
+    return values[-1], None, max(changes)
+
+
+def parse_arguments(args=None):
+    parser = argparse.ArgumentParser(description="Refine the stations of a load case until its results converge.")
+    parser.add_argument("load_case", help="load case in loadcases/")
+    parser.add_argument("--step", type=float, help="coarsest station spacing [m], the step of the load case by default")
+    parser.add_argument("--tolerance", type=float, default=1e-3, help="relative error to stop at")
+    parser.add_argument("--max-levels", type=int, default=6, help="maximum number of halvings of the step, plus one")
+    parser.add_argument("--pool-size", type=int, default=main.DataCalculator.threads,
+                        help="number of stages computed side by side")
+    return parser.parse_args(args)
+
+
+def run(args):
+    load_case = parse.load_load_case(args.load_case)
+    study = ConvergenceStudy(load_case, args.step, args.tolerance, args.max_levels, threads=args.pool_size)
+    result = study.run()
+    result.print_result()
+    print("Stages reused from coarser levels: {0}".format(study.result_cache.hits))
+    return result
+
+
+if __name__ == '__main__':
+    run(parse_arguments())
@@ -0,0 +1,292 @@
+import argparse
+import contextlib
+import copy
+import functools
+import io
+import itertools
+import multiprocessing
+import time
+
+import numpy as np
+
+import convergence
+import main
+import parse
+import population
+
+
+# load cases held by the worker processes, set once by init_worker, with a calculator per load case whose aerodynamic
+# stages every variant reuses; the variants come with the tasks, as they are small next to the load cases
+worker_load_cases = []
+worker_calculators = []
+
+
+def init_worker(load_cases):
+    global worker_load_cases, worker_calculators
+    worker_load_cases = load_cases
+    worker_calculators = [calc_aero(load_case) for load_case in load_cases]
+
+
+def calc_aero(load_case):
+    calculator = main.DataCalculator(load_case, plot=False)
+    with contextlib.redirect_stdout(io.StringIO()):
+        calculator.compute("aero_shear", "torsion")
+    return calculator
+
+
+def with_wing_box(load_case, wing_box):
+    # the load case on a copy of its wing with another wing box (and a fuel tank pointing at it), sharing the loads
+    load_case = copy.copy(load_case)
+    load_case.wing = copy.copy(load_case.wing)
+    load_case.wing.wing_box = wing_box
+    load_case.wing.fuel_tank = copy.copy(load_case.wing.fuel_tank)
+    load_case.wing.fuel_tank.wing_box = wing_box
+    if load_case.tolerance is not None:
+        # adaptive stations follow the stresses, so they differ per wing box
+        load_case.range = load_case.calc_range()
+    return load_case
+
+
+def calc_responses(calculator):
+    # the quantities of Exploration.quantities for an analyzed calculator, the deflection and twist at the tip
+    load_case = calculator.load_case
+    stations = load_case.range
+    tip = load_case.wing.wing_box.end_y
+    stress = np.concatenate((calculator.top_panel_stress(stations), calculator.bottom_panel_stress(stations)))
+    return [float(calculator.deflection(tip) / (tip * 2) * 100),
+            float(np.degrees(calculator.twist(tip))),
+            float(np.max(np.abs(stress))),
+            convergence.calc_min_margin(calculator.shear_buckling(stations)),
+            convergence.calc_min_margin(calculator.skin_buckling(stations)),
+            convergence.calc_min_margin(calculator.column_buckling(stations))]
+
+
+def evaluate(wing_box, load_cases, aero_calculators, responses_function=calc_responses):
+    # responses of one wing box for every load case, the aerodynamic stages taken from aero_calculators
+    responses = []
+    for load_case, aero_calculator in zip(load_cases, aero_calculators):
+        calculator = main.DataCalculator(with_wing_box(load_case, wing_box), plot=False)
+        calculator.reuse(aero_calculator, "aero_shear", "torsion")
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            calculator.analyze("deflection", "twist", "stress")
+        responses.append(responses_function(calculator))
+    return responses
+
+
+def evaluate_chunk(variants, responses_function=calc_responses):
+    start = time.perf_counter()
+    results = [evaluate(variants.to_wing_box(i), worker_load_cases, worker_calculators, responses_function)
+               for i in range(len(variants))]
+    return results, time.perf_counter() - start
+
+
+class ExplorationPool:
+    # worker processes evaluating populations of variants on the load cases, each started with the aerodynamic stages
+    # of every load case, which all variants share; a single process evaluates in the main process. responses_function
+    # turns an analyzed calculator into the responses of a variant, it has to be a module level function to reach the
+    # workers
+
+    chunks_per_worker = 4
+    poolsize = multiprocessing.cpu_count()
+
+    def __init__(self, load_cases, size=poolsize, responses_function=calc_responses):
+        self.load_cases = load_cases
+        self.size = size
+        self.responses_function = responses_function
+        self.pool = None
+        self.compute_time = 0
+
+    def start(self):
+        if self.size > 1:
+            self.pool = multiprocessing.Pool(self.size, initializer=init_worker, initargs=(self.load_cases,))
+        else:
+            init_worker(self.load_cases)
+
+    def evaluate(self, variants):
+        # (variant, load case, response) array, the responses being Exploration.quantities by default
+        if self.pool is None and (self.size > 1 or worker_load_cases is not self.load_cases):
+            self.start()
+        chunks = [variants.select(chunk) for chunk in np.array_split(np.arange(len(variants)), self.size * self.chunks_per_worker)
+                  if len(chunk) > 0]
+        evaluate_function = functools.partial(evaluate_chunk, responses_function=self.responses_function)
+        if self.pool is not None:
+            chunk_results = self.pool.map(evaluate_function, chunks)
+        else:
+            chunk_results = [evaluate_function(chunk) for chunk in chunks]
+        self.compute_time += sum(compute_time for results, compute_time in chunk_results)
+        return np.array([result for results, compute_time in chunk_results for result in results])
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+
+class DesignSpace:
+    # variants of a wing box on the grid of every combination of the values of the parameters
+
+    parameters = ["spar_thickness", "panel_thickness", "stringer_amount", "stringer_size", "joint_offset"]
+
+    def __init__(self, spar_thickness=(1.0,), panel_thickness=(1.0,), stringer_amount=(0,), stringer_size=(1.0,),
+                 joint_offset=(0.0,)):
+        self.spar_thickness = spar_thickness    # factors on the spar thicknesses of every section [-]
+        self.panel_thickness = panel_thickness  # factors on the panel thicknesses of every section [-]
+        self.stringer_amount = stringer_amount  # stringers added to every set, but the corner sets [-]
+        self.stringer_size = stringer_size      # factors on the width, height and thickness of every stringer [-]
+        self.joint_offset = joint_offset        # shift of every joint between sections along the span [m]
+
+    def calc_grid(self):
+        return np.array(list(itertools.product(*[np.atleast_1d(getattr(self, name)) for name in self.parameters])),
+                        dtype=float)
+
+    def create_population(self, wing_box):
+        grid = self.calc_grid()
+        variants = population.WingBoxPopulation.repeat(wing_box, len(grid))
+        section_variants, stringer_set_variants = variants.variant_indices()
+        sections = variants.sections
+        stringer_sets = variants.stringer_sets
+        for name in ("front_spar_t", "back_spar_t"):
+            sections[name] *= grid[section_variants, 0]
+        for name in ("top_panel_t", "bottom_panel_t"):
+            sections[name] *= grid[section_variants, 1]
+        # the corner sets, two stringers spanning the whole width, stay in the corners
+        corner = (stringer_sets["start_x"] == 0) & (stringer_sets["end_x"] == 1)
+        amount = np.maximum(stringer_sets["amount"] + grid[stringer_set_variants, 2].astype(int), 1)
+        stringer_sets["amount"] = np.where(corner, stringer_sets["amount"], amount)
+        for name in ("stringer_width", "stringer_height", "stringer_thickness"):
+            stringer_sets[name] *= grid[stringer_set_variants, 3]
+        position = np.arange(len(section_variants)) - variants.section_offsets[section_variants]
+        sections["start_y"] += np.where(position > 0, grid[section_variants, 4], 0)
+        sections["end_y"] += np.where(position < len(wing_box.sections) - 1, grid[section_variants, 4], 0)
+        if np.any(sections["end_y"] <= sections["start_y"]):
+            raise ValueError("Joint offsets of %s leave sections without length" % list(self.joint_offset))
+        return variants, grid
+
+
+class Exploration:
+
+    quantities = ["deflection", "twist", "max_stress", "min_shear_margin", "min_skin_margin", "min_column_margin"]
+
+    def __init__(self, wing_box, load_cases, design_space, poolsize=ExplorationPool.poolsize):
+        self.wing_box = wing_box
+        self.load_cases = load_cases
+        self.design_space = design_space
+        self.poolsize = poolsize
+
+    def run(self):
+        start = time.perf_counter()
+        variants, grid = self.design_space.create_population(self.wing_box)
+        # the weight of all variants at once, the analyses per variant spread over the worker processes
+        weights = variants.calc_weight()
+        pool = ExplorationPool(self.load_cases, self.poolsize)
+        try:
+            responses = pool.evaluate(variants)
+        finally:
+            pool.close()
+        return ExplorationResult(self.design_space, self.load_cases, grid, weights, responses,
+                                 time.perf_counter() - start, pool.compute_time)
+
+
+class ExplorationResult:
+
+    def __init__(self, design_space, load_cases, grid, weights, responses, wall_time=0.0, compute_time=0.0):
+        self.design_space = design_space
+        self.load_cases = load_cases
+        self.grid = grid            # (variant, parameter)
+        self.weights = weights      # (variant) [N]
+        self.responses = responses  # (variant, load case, quantity)
+        self.wall_time = wall_time
+        self.compute_time = compute_time
+
+    def __getitem__(self, name):
+        return self.responses[:, :, Exploration.quantities.index(name)]
+
+    def calc_min_margin(self):
+        # governing buckling margin of every variant over the load cases
+        return np.min(self.responses[:, :, 3:], axis=(1, 2))
+
+    def calc_feasible(self):
+        # deflection and twist are limited in magnitude, so the limits also hold for the negative load cases
+        limit_deflection = np.array([load_case.limit_deflection for load_case in self.load_cases])
+        limit_twist = np.array([load_case.limit_twist for load_case in self.load_cases])
+        yield_stress = self.load_cases[0].wing.wing_box.material.yield_stress
+        return np.all(np.abs(self["deflection"]) <= limit_deflection, axis=1) & \
+            np.all(np.abs(self["twist"]) <= limit_twist, axis=1) & \
+            np.all(self["max_stress"] <= yield_stress, axis=1) & (self.calc_min_margin() >= 1)
+
+    def calc_pareto_front(self, feasible_only=True):
+        # variants that no other variant beats on both weight and governing margin, lightest first
+        candidates = np.flatnonzero(self.calc_feasible()) if feasible_only else np.arange(len(self.weights))
+        margins = self.calc_min_margin()
+        front = []
+        best_margin = -np.inf
+        for i in candidates[np.lexsort((-margins[candidates], self.weights[candidates]))]:
+            if margins[i] > best_margin:
+                front.append(i)
+                best_margin = margins[i]
+        return np.array(front, dtype=int)
+
+    def save(self, path):
+        header = DesignSpace.parameters + ["weight", "feasible", "min_margin"] + \
+            ["%s:%s" % (load_case.name, quantity) for load_case in self.load_cases for quantity in Exploration.quantities]
+        data = np.column_stack([self.grid, self.weights, self.calc_feasible(), self.calc_min_margin(),
+                                self.responses.reshape(len(self.weights), -1)])
+        np.savetxt(path, data, delimiter=",", header=",".join(header), comments="")
+
+    def print_result(self):
+        feasible = self.calc_feasible()
+        print("")
+        print("Explored {0} variants on {1} load case(s) in {2:.1f} [s] ({3:.1f} [s] of analyses); {4} feasible".format(
+            len(self.weights), len(self.load_cases), self.wall_time, self.compute_time, np.count_nonzero(feasible)))
+        front = self.calc_pareto_front()
+        if len(front) == 0:
+            front = self.calc_pareto_front(False)
+            print("No feasible variant, Pareto front of all variants:")
+        else:
+            print("Pareto front of the feasible variants:")
+        print("".join("{0:>17}".format(name) for name in DesignSpace.parameters) +
+              "{0:>14}{1:>12}{2:>10}".format("Weight [N]", "Margin [-]", "Feasible"))
+        margins = self.calc_min_margin()
+        for i in front:
+            print("".join("{0:>17.4g}".format(value) for value in self.grid[i]) +
+                  "{0:>14.4e}{1:>12.3f}{2:>10}".format(self.weights[i], margins[i], "yes" if feasible[i] else "no"))
+
+
+def parse_arguments(args=None):
+    parser = argparse.ArgumentParser(description="Explore sizing variants of a wing box and report the Pareto front "
+                                                 "of weight against buckling margin.")
+    parser.add_argument("wing_box", help="wing box in wingboxes/ to vary")
+    parser.add_argument("load_cases", nargs="+", help="load cases in loadcases/ to evaluate every variant on")
+    parser.add_argument("--spar-thickness", nargs="+", type=float, default=[1.0], help="factors on the spar thicknesses")
+    parser.add_argument("--panel-thickness", nargs="+", type=float, default=[1.0], help="factors on the panel thicknesses")
+    parser.add_argument("--stringer-amount", nargs="+", type=int, default=[0], help="stringers added to every set")
+    parser.add_argument("--stringer-size", nargs="+", type=float, default=[1.0], help="factors on the stringer dimensions")
+    parser.add_argument("--joint-offset", nargs="+", type=float, default=[0.0], help="shifts of the section joints [m]")
+    parser.add_argument("--step", type=float, help="station spacing [m], the step of the load cases by default")
+    parser.add_argument("--pool-size", type=int, default=ExplorationPool.poolsize, help="number of worker processes")
+    parser.add_argument("--output", help="csv file to write the responses of every variant to")
+    return parser.parse_args(args)
+
+
+def run(args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        wing_box = parse.load_wing_box(args.wing_box)
+        load_cases = [parse.load_load_case(name) for name in args.load_cases]
+    for load_case in load_cases:
+        if args.step is not None:
+            load_case.step = args.step
+            load_case.range = load_case.calc_range()
+    design_space = DesignSpace(args.spar_thickness, args.panel_thickness, args.stringer_amount, args.stringer_size,
+                               args.joint_offset)
+    result = Exploration(wing_box, load_cases, design_space, args.pool_size).run()
+    result.print_result()
+    if args.output is not None:
+        result.save(args.output)
+        print("")
+        print("Results written to %s" % args.output)
+    return result
+
+
+if __name__ == '__main__':
+    run(parse_arguments())
@@ -0,0 +1,131 @@
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+import warnings
+
+
+# the active tracer, None unless tracing was asked for, so the counters cost a single check when it is off
+tracer = None
+
+
+def count(name, amount=1):
+    if tracer is not None:
+        tracer.count(name, amount)
+
+
+def span(name, **args):
+    if tracer is None:
+        return contextlib.nullcontext({})
+    return tracer.span(name, **args)
+
+
+def traced(func):
+    # traces every call of a calculator method as a span named after it
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if tracer is None:
+            return func(*args, **kwargs)
+        with tracer.span(func.__qualname__):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+class Tracer:
+
+    counters = ["integrals", "integrand_evaluations", "non_finite_evaluations", "geometry_evaluations"]
+
+    def __init__(self, path=None):
+        self.path = path
+        self.events = []
+        self.totals = dict.fromkeys(self.counters, 0)
+        self.warnings = []
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.start_time = time.perf_counter()
+        self.catcher = None
+
+    def __enter__(self):
+        global tracer
+        # warnings are recorded (every occurrence, not only the first) and shown once per kind when tracing stops
+        self.catcher = warnings.catch_warnings(record=True)
+        self.warnings = self.catcher.__enter__()
+        warnings.simplefilter("always")
+        tracer = self
+        return self
+
+    def __exit__(self, *exc_info):
+        global tracer
+        tracer = None
+        self.catcher.__exit__(*exc_info)
+        shown = set()
+        for warning in self.warnings:
+            kind = (warning.category, str(warning.message), warning.filename, warning.lineno)
+            if kind not in shown:
+                shown.add(kind)
+                warnings.showwarning(warning.message, warning.category, warning.filename, warning.lineno)
+        if self.path is not None:
+            self.save(self.path)
+        return False
+
+    def thread_counts(self):
+        # spans report the work of their own thread only, so stages running side by side are told apart
+        if not hasattr(self.local, "counts"):
+            self.local.counts = dict.fromkeys(self.counters, 0)
+        return self.local.counts
+
+    def count(self, name, amount=1):
+        self.thread_counts()[name] += amount
+        with self.lock:
+            self.totals[name] += amount
+
+    @contextlib.contextmanager
+    def span(self, name, **args):
+        counts = dict(self.thread_counts())
+        warning_count = len(self.warnings)
+        start = time.perf_counter()
+        try:
+            yield args
+        finally:
+            end = time.perf_counter()
+            for counter, value in self.thread_counts().items():
+                if value != counts[counter]:
+                    args[counter] = value - counts[counter]
+            if len(self.warnings) > warning_count:
+                args["warnings"] = sorted(set("%s: %s" % (warning.category.__name__, warning.message)
+                                              for warning in self.warnings[warning_count:]))
+            with self.lock:
+                self.events.append({"name": name, "start": start - self.start_time, "duration": end - start,
+                                    "thread": threading.get_ident(), "args": args})
+
+    def save(self, path):
+        # a .jsonl file gets one span per line, anything else the Chrome trace format (chrome://tracing, Perfetto)
+        threads = {ident: i for i, ident in enumerate(dict.fromkeys(event["thread"] for event in self.events))}
+        f = open(path, "w")
+        if os.path.splitext(path)[1] == ".jsonl":
+            for event in self.events:
+                f.write(json.dumps(dict(event, thread=threads[event["thread"]])) + "\n")
+        else:
+            trace = [{"name": event["name"], "cat": "analysis", "ph": "X", "pid": os.getpid(),
+                      "tid": threads[event["thread"]], "ts": event["start"] * 1e6,
+                      "dur": event["duration"] * 1e6, "args": event["args"]} for event in self.events]
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms", "otherData": self.totals}, f)
+        f.close()
+
+    def print_result(self):
+        print("")
+        print("Trace of {0} spans{1}".format(len(self.events), "" if self.path is None else " written to %s" % self.path))
+        totals = {}
+        for event in self.events:
+            total = totals.setdefault(event["name"], [0, 0.0, 0, 0])
+            total[0] += 1
+            total[1] += event["duration"]
+            total[2] += event["args"].get("integrand_evaluations", 0)
+            total[3] += len(event["args"].get("warnings", []))
+        print("{0:<40}{1:>8}{2:>12}{3:>16}{4:>10}".format("Span", "Calls", "Wall [s]", "Evaluations", "Warnings"))
+        for name, total in sorted(totals.items(), key=lambda item: -item[1][1]):
+            print("{0:<40}{1:>8}{2:>12.4f}{3:>16}{4:>10}".format(name, *total))
+        print("Totals: " + "; ".join("{0}: {1}".format(name, value) for name, value in self.totals.items()))
+        print("Warnings: {0}".format(len(self.warnings)))
@@ -0,0 +1,83 @@
+import numpy as np
+
+import instrument
+import piecewise
+
+
+def discontinuities(load_case):
+    # the wing box ends and where the loads or the section properties jump
+    wing = load_case.wing
+    wing_box = wing.wing_box
+    nodes = [[wing_box.start_y, wing_box.end_y]]
+    for section in wing_box.sections:
+        nodes.append([section.start_y, section.end_y])
+    if wing.engine is not None:
+        nodes.append([wing.engine.y])
+    if wing.fuel_tank is not None:
+        nodes.append([wing.fuel_tank.start_y, wing.fuel_tank.end_y])
+    return merge_nodes(load_case, *nodes)
+
+
+def spanwise_nodes(load_case):
+    return merge_nodes(load_case, load_case.range, discontinuities(load_case))
+
+
+def merge_nodes(load_case, *nodes):
+    wing_box = load_case.wing.wing_box
+    nodes = np.unique(np.concatenate(nodes))
+    nodes = nodes[(nodes >= wing_box.start_y) & (nodes <= wing_box.end_y)]
+    # stations from numpy.arange end up a rounding error away from the section boundaries
+    keep = np.append(True, np.diff(nodes) > 1e-9 * (wing_box.end_y - wing_box.start_y))
+    return nodes[keep]
+
+
+class SpanwiseIntegrator:
+
+    total_evaluations = 0  # integrand evaluations of all integrators in this process
+
+    def __init__(self, nodes, order=3):
+        self.nodes = np.asarray(nodes, dtype=float)
+        self.order = order  # Gauss points per interval, exact for polynomials up to degree 2 * order - 1
+        gauss_x, gauss_w = np.polynomial.legendre.leggauss(order)
+        self.widths = np.diff(self.nodes)
+        self.points = self.nodes[:-1, None] + self.widths[:, None] * (gauss_x + 1) / 2
+        # maps integrand values at the Gauss points onto the interpolating polynomial over [0, 1]
+        self.fit = np.linalg.inv(np.vander((gauss_x + 1) / 2, order, increasing=True))
+        self.evaluations = 0
+
+    @classmethod
+    def from_load_case(cls, load_case):
+        return cls(spanwise_nodes(load_case), load_case.order)
+
+    def integrate(self, func, from_tip=False):
+        return self.antiderivative(self.evaluate(func), from_tip)
+
+    def evaluate(self, func):
+        values = np.asarray(func(self.points.ravel()), dtype=float).reshape(self.points.shape)
+        self.evaluations += values.size
+        SpanwiseIntegrator.total_evaluations += values.size
+        if instrument.tracer is not None:
+            instrument.tracer.count("integrand_evaluations", values.size)
+            instrument.tracer.count("non_finite_evaluations", values.size - np.count_nonzero(np.isfinite(values)))
+        return values
+
+    def antiderivative(self, values, from_tip=False):
+        instrument.count("integrals")
+        coefficients = values @ self.fit.T  # (intervals, order), lowest power first in normalized coordinate
+        powers = np.arange(1, self.order + 1)
+        integrals = self.widths * np.sum(coefficients / powers, axis=1)
+        offsets = np.concatenate(([0.0], np.cumsum(integrals)[:-1]))
+        c = np.zeros((self.order + 1, len(self.widths)))
+        c[:-1] = (coefficients / powers / self.widths[:, None] ** (powers - 1)).T[::-1]
+        c[-1] = offsets
+        if from_tip:
+            c = -c
+            c[-1] += np.sum(integrals)
+        return piecewise.InboardPPoly(c, self.nodes, extrapolate=True)
+
+
+def from_tip(antiderivative, tip):
+    # integral from y to the tip, given the antiderivative from the root
+    c = -antiderivative.c
+    c[-1] += antiderivative(tip)
+    return piecewise.InboardPPoly(c, antiderivative.x, extrapolate=True)
@@ -1,19 +1,127 @@
-import multiprocessing
+import argparse
+import contextlib
+import os
+import sys
+import threading
+from concurrent import futures
+
 import numpy as np
 
 import analyze
+import cache
+import coefficients
+import instrument
+import integration
+import mesh
 import parse
+import piecewise
+import structure
+import util
+import wingloader
+
+
+class StageOutput:
+    # stdout and stderr while stages run side by side: each stage writes into its own buffer, replayed in order once
+    # it is done, so a failure message stays with the results it belongs to
+
+    def __init__(self, stdout, stderr):
+        self.streams = (stdout, stderr)
+        self.local = threading.local()
+        self.stdout = StageStream(self, 0)
+        self.stderr = StageStream(self, 1)
+
+    def replay(self, output):
+        # output is a list of (stream index, text) of a stage
+        for index, text in output:
+            self.streams[index].write(text)
+
+
+class StageStream:
+
+    def __init__(self, output, index):
+        self.output = output
+        self.index = index
+
+    def write(self, text):
+        buffer = getattr(self.output.local, "buffer", None)
+        if buffer is None:
+            return self.output.streams[self.index].write(text)
+        buffer.append((self.index, text))
+        return len(text)
+
+    def flush(self):
+        self.output.streams[self.index].flush()
+
 
-import matplotlib.pyplot as plt
+class Stage:
+
+    def __init__(self, dependencies, inputs, calc):
+        self.dependencies = dependencies  # stages whose results this one takes
+        self.inputs = inputs  # cache inputs of the stage besides the keys of its dependencies
+        self.calc = calc
 
 
 class DataCalculator:
 
-    poolsize = multiprocessing.cpu_count()
+    threads = 4  # stages computed side by side
+    # every key takes the source of the modules the stages and their inputs are computed with (this one included,
+    # for the stage definitions), a changed formula is a new key
+    code_version = cache.code_version(analyze, coefficients, integration, mesh, parse, piecewise, structure, util,
+                                      wingloader, sys.modules[__name__])
+
+    stages = {
+        "moi_xx": Stage([], lambda self: self.key_section_properties(),
+                        lambda self: analyze.MoIXXCalculator(self.load_case).calc()),
+        "moi_polar": Stage([], lambda self: self.key_section_properties(),
+                           lambda self: analyze.MoIPolarCalculator(self.load_case).calc()),
+        "aero_shear": Stage([], lambda self: (self.wing.key_aero(), self.load_case.density, self.load_case.velocity, self.wing_box.end_y),
+                            lambda self: analyze.ShearCalculator(self.load_case).calc_aero()),
+        "shear": Stage(["aero_shear"], lambda self: (self.wing.key_aero(), self.wing_box.key(), self.wing_box.material.key(), self.wing.fuel_tank.key(), self.wing.engine.key(), self.key_stations()),
+                       lambda self: analyze.ShearCalculator(self.load_case).calc(self.aero_shear)),
+        "moment": Stage(["shear"], lambda self: self.key_stations(),
+                        lambda self: analyze.MomentCalculator(self.load_case, self.shear).calc()),
+        "rotation": Stage(["moment", "moi_xx"], lambda self: (self.wing_box.material.e_modulus, self.key_stations()),
+                          lambda self: analyze.RotationCalculator(self.load_case, self.moment).calc()),
+        "deflection": Stage(["rotation"], lambda self: self.key_stations(),
+                            lambda self: analyze.DeflectionCalculator(self.load_case, self.rotation).calc()),
+        "torsion": Stage([], lambda self: (self.wing.key_aero(), self.load_case.density, self.load_case.velocity, self.wing.engine.key(), self.wing_box.start_y, self.wing_box.end_y, self.key_stations()),
+                         lambda self: analyze.TorsionCalculator(self.load_case).calc()),
+        "twist": Stage(["torsion", "moi_polar"], lambda self: (self.wing_box.material.shear_modulus, self.key_stations()),
+                       lambda self: analyze.TwistCalculator(self.load_case, self.torsion).calc()),
+        "top_panel_stress": Stage(["moment", "moi_xx"], lambda self: self.key_geometry(),
+                                  lambda self: analyze.TopPanelStressCalculator(self.load_case, self.moment).calc()),
+        "bottom_panel_stress": Stage(["moment", "moi_xx"], lambda self: self.key_geometry(),
+                                     lambda self: analyze.BottomPanelStressCalculator(self.load_case, self.moment).calc()),
+        "shear_buckling": Stage(["shear", "torsion", "moi_xx"],
+                                lambda self: (self.key_geometry(), coefficients.ks_clamped.key()),
+                                lambda self: analyze.WebBucklingCalculator(self.load_case, self.shear, self.torsion).calc()),
+        "skin_buckling": Stage(["top_panel_stress", "bottom_panel_stress"],
+                               lambda self: (self.key_geometry(), coefficients.kc_b.key(), coefficients.kc_c.key()),
+                               lambda self: analyze.SkinBucklingCalculator(self.load_case, self.top_panel_stress, self.bottom_panel_stress).calc()),
+        "column_buckling": Stage(["moment", "moi_xx"], lambda self: self.key_geometry(),
+                                 lambda self: analyze.ColumnBucklingCalculator(self.load_case, self.moment).calc()),
+    }
+
+    # stages computed (and plotted) by each analysis
+    analyses = {
+        "moi": ["moi_xx", "moi_polar"],
+        "deflection": ["shear", "moment", "rotation", "deflection"],
+        "twist": ["twist"],
+        "stress": ["top_panel_stress", "bottom_panel_stress", "shear_buckling", "skin_buckling", "column_buckling"],
+    }
 
-    def __init__(self, load_case):
+    def __init__(self, load_case, plot=True, result_cache=None, threads=threads):
         self.load_case = load_case
+        self.threads = threads
+        self.wing = load_case.wing
+        self.wing_box = load_case.wing.wing_box
+        self.plot = plot
+        self.figures = []
+        self.plotted = set()
+        self.result_cache = result_cache
+        self.keys = {}
 
+        self.aero_shear = None
         self.shear = None
         self.moment = None
         self.rotation = None
@@ -22,7 +130,6 @@ class DataCalculator:
         self.torsion = None
         self.twist = None
 
-        self.moi_analyzed = False
         self.moi_xx = None
         self.moi_polar = None
 
@@ -32,59 +139,162 @@ class DataCalculator:
         self.skin_buckling = None
         self.column_buckling = None
 
+    def key_stations(self):
+        return self.load_case.range, integration.spanwise_nodes(self.load_case), self.load_case.order
+
+    def key_section_properties(self):
+        # closed form section properties do not depend on the stations, sampled ones do
+        if self.wing_box.calc_properties() is not None:
+            return self.wing_box.key()
+        return self.wing_box.key(), self.load_case.range
+
+    def key_geometry(self):
+        return self.wing_box.key(), self.wing_box.material.key(), self.load_case.range
+
+    def find_stages(self, names):
+        # the requested stages and all their ancestors that are not computed yet, dependencies first
+        found = []
+
+        def visit(name):
+            if name not in found and name not in self.keys:
+                for dependency in self.stages[name].dependencies:
+                    visit(dependency)
+                found.append(name)
+
+        for name in names:
+            visit(name)
+        return found
+
+    def compute(self, *names):
+        # every stage starts as soon as the stages it takes are done, so independent branches run side by side
+        pending = self.find_stages(names)
+        order = list(pending)  # the output of the stages is written in this order, whichever finishes first
+        outputs = {}
+        running = {}
+        output = StageOutput(sys.stdout, sys.stderr)
+        with contextlib.redirect_stdout(output.stdout), contextlib.redirect_stderr(output.stderr), \
+                futures.ThreadPoolExecutor(self.threads) as executor:
+            while len(pending) > 0 or len(running) > 0:
+                for name in list(pending):
+                    if all(dependency in self.keys for dependency in self.stages[name].dependencies):
+                        pending.remove(name)
+                        running[executor.submit(self.calc_stage, name, output)] = name
+                done = futures.wait(running, return_when=futures.FIRST_COMPLETED)[0]
+                for future in done:
+                    name = running.pop(future)
+                    key, value, outputs[name] = future.result()
+                    setattr(self, name, value)
+                    self.keys[name] = key
+                    if name in ("moi_xx", "moi_polar"):
+                        # load cases of the same wing share its wing box, the later stages use its interpolants
+                        self.wing_box.attach_moi(name, value)
+                while len(order) > 0 and order[0] in outputs:
+                    output.replay(outputs.pop(order.pop(0)))
+
+    def calc_key(self, name):
+        # a stage is keyed by its own inputs and the keys of the stages it builds on
+        stage = self.stages[name]
+        return cache.digest(self.code_version, name, [self.keys[dependency] for dependency in stage.dependencies],
+                            stage.inputs(self))
+
+    def reuse(self, other, *names):
+        # takes the stages of another calculator that have the same key here, like the aerodynamic loads of a load case
+        # run on another wing box; the others are left to be computed
+        for name in names:
+            if name in other.keys and all(dependency in self.keys for dependency in self.stages[name].dependencies):
+                if self.calc_key(name) == other.keys[name]:
+                    setattr(self, name, getattr(other, name))
+                    self.keys[name] = other.keys[name]
+
+    def calc_stage(self, name, output):
+        stage = self.stages[name]
+        key = self.calc_key(name)
+
+        def calc():
+            # the calculators print their results while computing, the output is cached with the value so a hit
+            # reports the same
+            output.local.buffer = []
+            return stage.calc(self), output.local.buffer
+
+        with instrument.span(name, load_case=self.load_case.name) as trace:
+            if self.result_cache is None:
+                value, stage_output = calc()
+            else:
+                misses = self.result_cache.misses
+                value, stage_output = self.result_cache.get(key, calc)
+                trace["cache"] = "miss" if self.result_cache.misses > misses else "hit"
+        output.local.buffer = None
+        return key, value, stage_output
+
+    def analyze(self, *names):
+        # section properties go with every analysis, as the other stages are built on them
+        names = ["moi"] + [name for name in names if name != "moi"]
+        self.compute(*[stage for name in names for stage in self.analyses[name]])
+        if self.plot:
+            for name in names:
+                if name not in self.plotted:
+                    getattr(self, "plot_" + name)()
+                    self.plotted.add(name)
+
     def analyze_moi(self):
-        if not self.moi_analyzed:
-            self.moi_xx = analyze.MoIXXCalculator(self.load_case).calc(self.poolsize)
-            self.moi_polar = analyze.MoIPolarCalculator(self.load_case).calc(self.poolsize)
-            plot_diagram(self.load_case.range, self.moi_xx, "Moment of Inertia around X-axis", "Wing span[m]", "I$_{xx}$ [m$^4$]")
-            plot_diagram(self.load_case.range, self.moi_polar, "Polar Moment of Inertia", "Wing span [m]", "J [m$^4$]")
-            self.moi_analyzed = True
+        self.analyze("moi")
+
+    def analyze_shear(self):
+        self.compute("aero_shear", "shear", "moment")
+
+    def analyze_torsion(self):
+        self.compute("torsion")
 
     def analyze_deflection(self):
-        self.analyze_moi()
-        self.shear = analyze.ShearCalculator(self.load_case).calc(self.poolsize)
-        self.moment = analyze.MomentCalculator(self.load_case, self.shear).calc(self.poolsize)
-        self.rotation = analyze.RotationCalculator(self.load_case, self.moment).calc(self.poolsize)
-        self.deflection = analyze.DeflectionCalculator(self.load_case, self.rotation).calc(self.poolsize)
-        plot_diagram(self.load_case.range, self.shear, "Shear Force", "Wing span [m]", "Shear force [N]")
-        plot_diagram(self.load_case.range, self.moment, "Bending Moment", "Wing span [m]", "Bending moment [Nm]")
-        plot_diagram(self.load_case.range, self.rotation, "Rotation", "Wing span [m]", "Rotation [rad]")
-        plot_diagram(self.load_case.range, self.deflection, "Wing Deflection", "Wing span [m]", "Deflection [m]")
+        self.analyze("deflection")
 
     def analyze_twist(self):
-        self.analyze_moi()
-        self.torsion = analyze.TorsionCalculator(self.load_case).calc(self.poolsize)
-        self.twist = analyze.TwistCalculator(self.load_case, self.torsion).calc(self.poolsize)
-        plot_diagram(self.load_case.range, lambda y: np.degrees(self.twist(y)), "Wing Twist", "Wing span [m]", "Angle of twist [$^\\deg$]")
+        self.analyze("twist")
 
     def analyze_stress(self):
-        self.analyze_moi()
-        if self.shear is None:
-            self.shear = analyze.ShearCalculator(self.load_case).calc(self.poolsize)
-        if self.moment is None:
-            self.moment = analyze.MomentCalculator(self.load_case, self.shear).calc(self.poolsize)
-        if self.torsion is None:
-            self.torsion = analyze.TorsionCalculator(self.load_case).calc(self.poolsize)
-        self.top_panel_stress = analyze.TopPanelStressCalculator(self.load_case, self.moment).calc(self.poolsize)
-        self.bottom_panel_stress = analyze.BottomPanelStressCalculator(self.load_case, self.moment).calc(self.poolsize)
-        self.shear_buckling = analyze.WebBucklingCalculator(self.load_case, self.shear, self.torsion).calc(self.poolsize)
-        self.skin_buckling = analyze.SkinBucklingCalculator(self.load_case, self.top_panel_stress, self.bottom_panel_stress).calc(self.poolsize)
-        self.column_buckling = analyze.ColumnBucklingCalculator(self.load_case, self.moment).calc(self.poolsize)
-        plt.hlines(1, min(self.load_case.range), max(self.load_case.range))
-        plot_diagram(self.load_case.range, self.shear_buckling, "Margin of safety for shear buckling", "Wing span [m]", "Margin of safety [-]", hline=1, axis=[min(self.load_case.range), max(self.load_case.range), 0, 10])
-        plot_diagram(self.load_case.range, self.skin_buckling, "Margin of safety for skin buckling", "Wing span [m]", "Margin of safety [-]", hline=1, axis=[min(self.load_case.range), max(self.load_case.range), 0, 10])
-        plot_diagram(self.load_case.range, self.column_buckling, "Margin of safety for column buckling", "Wing span [m]", "Margin of safety[-]", hline=1, axis=[min(self.load_case.range), max(self.load_case.range), 0, 10])
+        self.analyze("stress")
+
+    def plot_moi(self):
+        self.plot_diagram(self.moi_xx, "Moment of Inertia around X-axis", "Wing span[m]", "I$_{xx}$ [m$^4$]")
+        self.plot_diagram(self.moi_polar, "Polar Moment of Inertia", "Wing span [m]", "J [m$^4$]")
+
+    def plot_deflection(self):
+        self.plot_diagram(self.shear, "Shear Force", "Wing span [m]", "Shear force [N]")
+        self.plot_diagram(self.moment, "Bending Moment", "Wing span [m]", "Bending moment [Nm]")
+        self.plot_diagram(self.rotation, "Rotation", "Wing span [m]", "Rotation [rad]")
+        self.plot_diagram(self.deflection, "Wing Deflection", "Wing span [m]", "Deflection [m]")
+
+    def plot_twist(self):
+        self.plot_diagram(lambda y: np.degrees(self.twist(y)), "Wing Twist", "Wing span [m]", "Angle of twist [$^\\deg$]")
+
+    def plot_stress(self):
+        axis = [min(self.load_case.range), max(self.load_case.range), 0, 10]
+        self.plot_diagram(self.shear_buckling, "Margin of safety for shear buckling", "Wing span [m]", "Margin of safety [-]", hline=1, axis=axis)
+        self.plot_diagram(self.skin_buckling, "Margin of safety for skin buckling", "Wing span [m]", "Margin of safety [-]", hline=1, axis=axis)
+        self.plot_diagram(self.column_buckling, "Margin of safety for column buckling", "Wing span [m]", "Margin of safety[-]", hline=1, axis=axis)
+
+    def calc_weight(self):
+        return analyze.ShearCalculator(self.load_case).calc_weight_wing_box()
+
+    def plot_diagram(self, y_function, title, xlabel, ylabel, **kwargs):
+        self.figures.append((title, plot_diagram(self.load_case.range, y_function, title, xlabel, ylabel, **kwargs)))
+
+    def save_plots(self, directory):
+        for title, figure in self.figures:
+            figure.savefig(os.path.join(directory, util.file_name("%s %s.png" % (self.load_case.name, title))))
 
     def show_plots(self):
+        import matplotlib.pyplot as plt
         plt.show()
 
 
 def plot_diagram(x, y_function, title, xlabel, ylabel, **kwargs):
-    plt.figure()
+    import matplotlib.pyplot as plt
+    figure = plt.figure()
     plt.title(title)
     plt.xlabel(xlabel)
     plt.ylabel(ylabel)
-    plt.grid(b=True, which='major', color='#f0f0f0', linestyle='-')
+    plt.grid(True, which='major', color='#f0f0f0', linestyle='-')
     plt.ticklabel_format(axis='y', style='sci', scilimits=(-2, 2))
     y = []
     for i in x:
@@ -94,15 +304,74 @@ def plot_diagram(x, y_function, title, xlabel, ylabel, **kwargs):
         plt.hlines(kwargs.get("hline"), axis[0], axis[1])
     plt.axis(axis)
     plt.plot(x, y_function(x))
+    return figure
+
+
+def parse_arguments(args=None):
+    parser = argparse.ArgumentParser(description="Analyze wing boxes for one or more load cases.")
+    parser.add_argument("load_cases", nargs="*", help="names or glob patterns of load cases in loadcases/, "
+                                                     "prompted for when omitted")
+    parser.add_argument("--step", type=float, help="station spacing [m], overrides the step of the load cases")
+    parser.add_argument("--tolerance", type=float, help="place the stations adaptively to this relative error "
+                                                        "instead of at a uniform step")
+    parser.add_argument("--pool-size", type=int, default=DataCalculator.threads,
+                        help="number of stages computed side by side")
+    parser.add_argument("--analyses", nargs="+", choices=["deflection", "twist", "stress"],
+                        default=["deflection", "twist", "stress"], help="analyses to run")
+    parser.add_argument("--output", help="directory to write the results (and figures) to")
+    parser.add_argument("--headless", action="store_true", help="only compute numbers, never import matplotlib")
+    parser.add_argument("--cache", default=".cache", help="directory of the on-disk result cache")
+    parser.add_argument("--cache-size", type=float, default=256, help="maximum size of the result cache [MB]")
+    parser.add_argument("--no-cache", action="store_true", help="recompute every stage and leave the cache alone")
+    parser.add_argument("--trace", help="write a trace of the stages to this file, as JSON lines when it ends in "
+                                        ".jsonl and in the Chrome trace format otherwise")
+    arguments = parser.parse_args(args)
+    if arguments.pool_size < 1:
+        parser.error("--pool-size must be at least 1")
+    return arguments
+
+
+def run(args):
+    if args.trace is None:
+        load_case_sweep = run_analyses(args)
+    else:
+        with instrument.Tracer(args.trace) as tracer:
+            load_case_sweep = run_analyses(args)
+        tracer.print_result()
+    if args.output is None and not args.headless:
+        load_case_sweep.calculators[0].show_plots()
+
+
+def run_analyses(args):
+    import sweep
+    result_cache = None if args.no_cache else cache.ResultCache(args.cache, args.cache_size * 1e6,
+                                                                DataCalculator.code_version)
+    load_case_sweep = sweep.LoadCaseSweep.from_files(args.load_cases, result_cache=result_cache, threads=args.pool_size)
+    if args.step is not None or args.tolerance is not None:
+        for load_case in load_case_sweep.load_cases:
+            if args.step is not None:
+                load_case.step = args.step
+            if args.tolerance is not None:
+                load_case.tolerance = args.tolerance
+            load_case.range = load_case.calc_range()
+    plot = not args.headless
+    result = load_case_sweep.run("deflection" in args.analyses, "twist" in args.analyses, "stress" in args.analyses, plot)
+    if len(load_case_sweep.load_cases) > 1:
+        result.print_result()
+    if result_cache is not None:
+        result_cache.print_result()
+    for calculator in load_case_sweep.calculators:
+        print("Weight of {0} is {1:.3e} [N]".format(calculator.load_case.name, calculator.calc_weight()))
+    if args.output is not None:
+        os.makedirs(args.output, exist_ok=True)
+        result.save(args.output)
+        for calculator in load_case_sweep.calculators:
+            calculator.save_plots(args.output)
+    return load_case_sweep
 
 
 if __name__ == '__main__':
-    input_load_cases_str = input("Enter load case:")
-    input_load_case = parse.load_load_case(input_load_cases_str)
-
-    main = DataCalculator(input_load_case)
-    main.analyze_deflection()
-    main.analyze_twist()
-    main.analyze_stress()
-    print("Weight is {0:.3e} [N]".format(analyze.ShearCalculator(input_load_case).calc_weight_wing_box()))
-    main.show_plots()
+    arguments = parse_arguments()
+    if len(arguments.load_cases) == 0:
+        arguments.load_cases = input("Enter load case:").split()
+    run(arguments)
@@ -0,0 +1,56 @@
+import numpy as np
+
+import analyze
+import integration
+
+
+max_iterations = 30
+joint_offset = 1e-6  # distance of the station outboard of a section joint, as a fraction of the span
+
+
+def adaptive_range(load_case, tolerance):
+    # stations that resolve the shear and moment to a relative error of tolerance under linear interpolation, starting
+    # from the discontinuities and halving every interval that is still too coarse
+    wing_box = load_case.wing.wing_box
+    span = wing_box.end_y - wing_box.start_y
+    distributions = calc_distributions(load_case)
+    sample = np.linspace(wing_box.start_y, wing_box.end_y, 1001)
+    scales = [np.max(np.abs(distribution(sample))) for distribution in distributions]
+
+    stations = integration.discontinuities(load_case)
+    for i in range(max_iterations):
+        refine = calc_error(stations, distributions, scales) > tolerance
+        if not np.any(refine):
+            break
+        stations = np.sort(np.concatenate((stations, (stations[:-1][refine] + stations[1:][refine]) / 2)))
+
+    # a station just outboard of every joint samples the properties on both sides of the jump
+    joints = [section.start_y + joint_offset * span for section in wing_box.sections[1:]]
+    # like the uniform stations, the tip itself is left out, where the moment and so the stresses vanish
+    return np.sort(np.concatenate((stations[:-1], joints)))
+
+
+def calc_distributions(load_case):
+    # with every discontinuity and every breakpoint of the aerodynamic loads as a node the shear and moment are exact,
+    # whatever the stations are
+    nodes = integration.merge_nodes(load_case, integration.discontinuities(load_case), load_case.wing.loads.lift_integral.x)
+    shear = analyze.ShearCalculator(load_case).calc_distribution(integration.SpanwiseIntegrator(nodes, load_case.order))
+    moment = analyze.MomentCalculator(load_case, shear).calc_distribution()
+    # the buckling margins go with the inverse of the panel stresses, so those are resolved too
+    top_panel_stress = analyze.TopPanelStressCalculator(load_case, moment).value
+    bottom_panel_stress = analyze.BottomPanelStressCalculator(load_case, moment).value
+    return shear, moment, top_panel_stress, bottom_panel_stress
+
+
+def calc_error(stations, distributions, scales):
+    # linear interpolation over an interval of width h misses h^2 / 8 f'', estimated from a second difference inside
+    # the interval, so the jumps on the stations themselves do not count
+    start = stations[:-1]
+    width = np.diff(stations)
+    error = np.zeros(len(width))
+    for distribution, scale in zip(distributions, scales):
+        middle = distribution(start + width / 2)
+        second_difference = distribution(start + width / 4) - 2 * middle + distribution(start + 3 * width / 4)
+        # relative to the local value, down to a hundredth of the maximum where the distribution vanishes at the tip
+        error = np.maximum(error, 2 * np.abs(second_difference) / np.maximum(np.abs(middle), scale / 100))
+    return error
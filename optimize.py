@@ -0,0 +1,235 @@
+import argparse
+import contextlib
+import io
+import time
+
+import numpy as np
+from scipy import optimize
+
+import explore
+import convergence
+import parse
+import population
+
+
+def calc_section_responses(calculator):
+    # the tip deflection and twist like explore.calc_responses, then per section the highest panel stress and the
+    # lowest margins, so a constraint follows one section rather than whichever section governs
+    load_case = calculator.load_case
+    stations = load_case.range
+    wing_box = load_case.wing.wing_box
+    responses = list(explore.calc_responses(calculator)[:2])
+    indices = wing_box.get_section_indices(stations)
+    stress = np.maximum(np.abs(calculator.top_panel_stress(stations)), np.abs(calculator.bottom_panel_stress(stations)))
+    margins = [calculator.shear_buckling(stations), calculator.skin_buckling(stations),
+               calculator.column_buckling(stations)]
+    for i in range(len(wing_box.sections)):
+        mask = indices == i
+        responses.append(float(np.max(stress[mask], initial=0)))
+        responses += [convergence.calc_min_margin(margin[mask]) for margin in margins]
+    return responses
+
+
+class SizingProblem:
+    # the thicknesses and stringer dimensions of every section of a wing box as factors on their initial values, the
+    # design variables being their logarithms so they stay positive and are all of the same scale
+
+    variables = ["front_spar_t", "back_spar_t", "top_panel_t", "bottom_panel_t", "stringer_width", "stringer_height",
+                 "stringer_thickness"]
+    stringer_variables = variables[4:]
+    # stringers keep close to the size they were laid out with, so they still fit between the spars and each other
+    factor_bounds = {"stringer_width": (0.5, 2), "stringer_height": (0.5, 2)}
+    constraints = ["deflection", "twist"]
+    section_constraints = ["yield", "shear_buckling", "skin_buckling", "column_buckling"]
+    max_constraint = np.log(1e3)  # ratios above 1000 count as 1000, so a response of zero stays finite
+
+    def __init__(self, wing_box, load_cases, pool, step=1e-3, min_factor=0.2, max_factor=20):
+        self.wing_box = wing_box
+        self.load_cases = load_cases
+        self.pool = pool  # explore.ExplorationPool, holding the aerodynamic stages of the load cases
+        self.step = step  # of the forward differences, in the logarithm of the factors
+        bounds = [np.log(self.factor_bounds.get(name, (min_factor, max_factor))) for name in self.variables]
+        self.bounds = [tuple(bound) for bound in bounds] * len(wing_box.sections)
+        self.evaluations = {}  # design variables (bytes) to weight and constraints
+        self.designs = 0
+        self.batches = 0
+        self.weight = population.WingBoxPopulation.from_wing_boxes([wing_box]).calc_weight()[0]
+
+    def calc_size(self):
+        return len(self.wing_box.sections) * len(self.variables)
+
+    def create_population(self, designs):
+        # a variant of the wing box for every row of design variables
+        factors = np.exp(np.atleast_2d(designs)).reshape(len(designs), len(self.wing_box.sections), len(self.variables))
+        variants = population.WingBoxPopulation.repeat(self.wing_box, len(designs))
+        section_variants, stringer_set_variants = variants.variant_indices()
+        position = np.arange(len(section_variants)) - variants.section_offsets[section_variants]
+        for i, name in enumerate(self.variables):
+            if name not in self.stringer_variables:
+                variants.sections[name] *= factors[section_variants, position, i]
+        # the stringer sets of a section, but its corner sets, take the stringer factors of the section
+        stringer_set_sections = np.repeat(position, np.diff(variants.stringer_set_offsets))
+        stringer_sets = variants.stringer_sets
+        corner = (stringer_sets["start_x"] == 0) & (stringer_sets["end_x"] == 1)
+        for name in self.stringer_variables:
+            i = self.variables.index(name)
+            stringer_sets[name] *= np.where(corner, 1.0, factors[stringer_set_variants, stringer_set_sections, i])
+        return variants
+
+    def evaluate(self, designs):
+        # weights relative to the initial one and constraints, at least zero when satisfied, of every design in one
+        # batch; designs evaluated before are taken from the record
+        designs = np.atleast_2d(designs)
+        new = [design for design in designs if design.tobytes() not in self.evaluations]
+        if len(new) > 0:
+            variants = self.create_population(np.array(new))
+            weights = variants.calc_weight() / self.weight
+            constraints = self.calc_constraints(self.pool.evaluate(variants))
+            for design, weight, constraint in zip(new, weights, constraints):
+                self.evaluations[design.tobytes()] = weight, constraint
+            self.designs += len(new)
+            self.batches += 1
+        return [self.evaluations[design.tobytes()] for design in designs]
+
+    def calc_constraints(self, responses):
+        # (design, load case, response) of calc_section_responses to constraints, as logarithms of the allowed over
+        # the actual value: deflections, stresses and buckling margins go about as powers of the thicknesses, so these
+        # are close to linear in the design variables
+        limit_deflection = np.array([load_case.limit_deflection for load_case in self.load_cases])
+        limit_twist = np.array([load_case.limit_twist for load_case in self.load_cases])
+        with np.errstate(divide='ignore'):
+            ratios = np.array(responses)
+            ratios[:, :, 0] = limit_deflection / np.abs(responses[:, :, 0])
+            ratios[:, :, 1] = limit_twist / np.abs(responses[:, :, 1])
+            ratios[:, :, 2::4] = self.wing_box.material.yield_stress / responses[:, :, 2::4]
+            constraints = np.log(ratios)
+        # margins without a compressed station are infinite
+        return np.minimum(constraints, self.max_constraint).reshape(len(responses), -1)
+
+    def calc_gradients(self, design):
+        # forward differences of every design variable, evaluated together with the design in one batch
+        designs = design + np.vstack((np.zeros(len(design)), np.eye(len(design)) * self.step))
+        evaluations = self.evaluate(designs)
+        weights = np.array([evaluation[0] for evaluation in evaluations])
+        constraints = np.array([evaluation[1] for evaluation in evaluations])
+        return (weights[1:] - weights[0]) / self.step, ((constraints[1:] - constraints[0]) / self.step).T
+
+    def weight_function(self, design):
+        return self.evaluate(design)[0][0]
+
+    def weight_gradient(self, design):
+        return self.calc_gradients(design)[0]
+
+    def constraint_function(self, design):
+        return self.evaluate(design)[0][1]
+
+    def constraint_gradient(self, design):
+        return self.calc_gradients(design)[1]
+
+
+class SizingOptimizer:
+
+    def __init__(self, wing_box, load_cases, poolsize=explore.ExplorationPool.poolsize, step=1e-3, max_iterations=50,
+                 tolerance=1e-4):
+        self.wing_box = wing_box
+        self.load_cases = load_cases
+        self.poolsize = poolsize
+        self.step = step
+        self.max_iterations = max_iterations
+        self.tolerance = tolerance
+
+    def run(self):
+        start = time.perf_counter()
+        pool = explore.ExplorationPool(self.load_cases, self.poolsize, calc_section_responses)
+        problem = SizingProblem(self.wing_box, self.load_cases, pool, self.step)
+        history = []
+
+        def callback(design):
+            weight, constraints = problem.evaluate(design)[0]
+            history.append((weight, np.min(constraints)))
+            print("Iteration {0}: weight {1:.4f} of the initial one, lowest constraint {2:.3e}".format(
+                len(history), weight, np.min(constraints)))
+
+        try:
+            solution = optimize.minimize(problem.weight_function, np.zeros(problem.calc_size()),
+                                         jac=problem.weight_gradient, method="SLSQP", bounds=problem.bounds,
+                                         constraints=[{"type": "ineq", "fun": problem.constraint_function,
+                                                       "jac": problem.constraint_gradient}],
+                                         options={"maxiter": self.max_iterations, "ftol": self.tolerance},
+                                         callback=callback)
+        finally:
+            pool.close()
+        weight, constraints = problem.evaluate(solution.x)[0]
+        return SizingResult(problem, solution, weight, constraints, history, time.perf_counter() - start, pool.compute_time)
+
+
+class SizingResult:
+
+    def __init__(self, problem, solution, weight, constraints, history, wall_time=0.0, compute_time=0.0):
+        self.problem = problem
+        self.solution = solution
+        self.factors = np.exp(solution.x).reshape(len(problem.wing_box.sections), len(problem.variables))
+        self.weight = weight * problem.weight  # [N]
+        self.constraints = constraints.reshape(len(problem.load_cases), -1)
+        self.history = history
+        self.wall_time = wall_time
+        self.compute_time = compute_time
+
+    def is_feasible(self, tolerance=1e-3):
+        return bool(np.all(self.constraints >= -tolerance))
+
+    def create_wing_box(self):
+        wing_box = self.problem.create_population(self.solution.x[None, :]).to_wing_box(0)
+        wing_box.name = "%s-optimized" % self.problem.wing_box.name
+        return wing_box
+
+    def print_result(self):
+        print("")
+        print("Optimization {0} after {1} iterations: {2}".format(
+            "converged" if self.solution.success else "stopped", self.solution.nit, self.solution.message))
+        print("Weight: {0:.4e} [N], initially {1:.4e} [N]; {2}".format(
+            self.weight, self.problem.weight, "feasible" if self.is_feasible() else "NOT feasible"))
+        print("{0} designs analyzed in {1} batches, {2:.1f} [s] ({3:.1f} [s] of analyses)".format(
+            self.problem.designs, self.problem.batches, self.wall_time, self.compute_time))
+        print("")
+        print("{0:<24}".format("Section") + "".join("{0:>20}".format(name) for name in SizingProblem.variables))
+        for section, factors in zip(self.problem.wing_box.sections, self.factors):
+            print("{0:<24}".format("{0:.2f}, {1:.2f} [m]".format(section.start_y, section.end_y)) +
+                  "".join("{0:>20.4g}".format(factor) for factor in factors))
+        print("")
+        # the section constraints by their lowest section
+        names = SizingProblem.constraints + SizingProblem.section_constraints
+        print("{0:<24}".format("Constraint (>= 0)") + "".join("{0:>16}".format(name) for name in names))
+        for load_case, constraints in zip(self.problem.load_cases, self.constraints):
+            values = list(constraints[:2]) + list(np.min(constraints[2:].reshape(-1, 4), axis=0))
+            print("{0:<24}".format(load_case.name) + "".join("{0:>16.3e}".format(value) for value in values))
+
+
+def parse_arguments(args=None):
+    parser = argparse.ArgumentParser(description="Minimize the weight of a wing box under deflection, twist, yield "
+                                                 "and buckling constraints, sizing the spar, panel and stringer "
+                                                 "thicknesses and the stringer width and height of every section.")
+    parser.add_argument("wing_box", help="wing box in wingboxes/ to start from")
+    parser.add_argument("load_cases", nargs="+", help="load cases in loadcases/ to size for")
+    parser.add_argument("--step", type=float, help="station spacing [m], the step of the load cases by default")
+    parser.add_argument("--difference-step", type=float, default=1e-3, help="finite difference step of the log factors")
+    parser.add_argument("--max-iterations", type=int, default=50, help="maximum number of iterations")
+    parser.add_argument("--pool-size", type=int, default=explore.ExplorationPool.poolsize, help="number of worker processes")
+    return parser.parse_args(args)
+
+
+def run(args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        wing_box = parse.load_wing_box(args.wing_box)
+        load_cases = [parse.load_load_case(name) for name in args.load_cases]
+    for load_case in load_cases:
+        if args.step is not None:
+            load_case.step = args.step
+            load_case.range = load_case.calc_range()
+    result = SizingOptimizer(wing_box, load_cases, args.pool_size, args.difference_step, args.max_iterations).run()
+    result.print_result()
+    return result
+
+
+if __name__ == '__main__':
+    run(parse_arguments())
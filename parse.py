@@ -1,9 +1,12 @@
+import copy
+
 import structure
 import util
 
 
 materials = []
 stringer_types = []
+wings = {}
 
 
 def load_wing(file):
@@ -41,6 +44,8 @@ def parse_wing(lines):
             wing.wing_box = load_wing_box(tokens[1])
         elif tokens[0] == "surface_area":
             wing.surface_area = float(tokens[1])
+        elif tokens[0] == "xflr":
+            wing.xflr_directory = tokens[1]
         elif tokens[0] == "engine":
             engine_lines.clear()
             engine_lines.append(tokens[1].replace('{', ''))
@@ -112,9 +117,9 @@ def parse_wing_box(lines):
             wing_box.start_y = float(wing_box_range[0])
             wing_box.end_y = float(wing_box_range[1])
         elif tokens[0] == "width":
-            wing_box.width = util.GeometryFunction(tokens[1])
+            wing_box.width = util.GeometryFunction(tokens[1], ("y",))
         elif tokens[0] == "height":
-            wing_box.height = util.GeometryFunction(tokens[1])
+            wing_box.height = util.GeometryFunction(tokens[1], ("y",))
         elif tokens[0] == "material":
             wing_box.material = get_material(tokens[1])
         elif tokens[0] == "section":
@@ -170,6 +175,8 @@ def parse_wing_box_section(lines):
             stringer_set_lines.clear()
             stringer_set_lines.append(tokens[1].replace('{', ''))
             level += 1
+    # the stringer properties are built once here, the sections only rebuild them after their stringer sets change
+    wing_box_section.calc_properties()
     return wing_box_section
 
 
@@ -226,7 +233,9 @@ def load_load_case(file):
     f = open("loadcases/%s.case" % file, 'r')
     lines = f.readlines()
     f.close()
-    return parse_load_case(lines)
+    load_case = parse_load_case(lines)
+    load_case.name = file
+    return load_case
 
 
 def parse_load_case(lines):
@@ -234,9 +243,13 @@ def parse_load_case(lines):
     for line in lines:
         tokens = [i.strip() for i in line.split(':')]
         if tokens[0] == "wing":
-            load_case.wing = load_wing(tokens[1])
+            load_case.wing = get_wing(tokens[1])
         elif tokens[0] == "step":
             load_case.step = float(tokens[1])
+        elif tokens[0] == "tolerance":
+            load_case.tolerance = float(tokens[1])
+        elif tokens[0] == "integration_order":
+            load_case.order = int(tokens[1])
         elif tokens[0] == "load_factor":
             load_case.load_factor = float(tokens[1])
         elif tokens[0] == "velocity":
@@ -249,10 +262,10 @@ def parse_load_case(lines):
             load_case.limit_deflection = float(tokens[1])
         elif tokens[0] == "limit_twist":
             load_case.limit_twist = float(tokens[1])
-    import numpy
     import wingloader
-    load_case.range = numpy.arange(load_case.wing.wing_box.start_y, load_case.wing.wing_box.end_y, load_case.step)
+    # adaptive stations are placed on the loads, so those go first
     wingloader.load_wing_properties(load_case, load_case.wing)
+    load_case.range = load_case.calc_range()
     return load_case
 
 
@@ -270,15 +283,15 @@ def parse_stringer_type(lines):
         if tokens[0] == "name":
             stringer_type.name = tokens[1]
         elif tokens[0] == "area":
-            stringer_type.area = util.GeometryFunction(tokens[1])
+            stringer_type.area = util.GeometryFunction(tokens[1], ("w", "h", "t"))
         elif tokens[0] == "centroid_x":
-            stringer_type.centroid_x = util.GeometryFunction(tokens[1])
+            stringer_type.centroid_x = util.GeometryFunction(tokens[1], ("w", "h", "t"))
         elif tokens[0] == "centroid_z":
-            stringer_type.centroid_z = util.GeometryFunction(tokens[1])
+            stringer_type.centroid_z = util.GeometryFunction(tokens[1], ("w", "h", "t"))
         elif tokens[0] == "moi_xx":
-            stringer_type.moi_xx = util.GeometryFunction(tokens[1])
+            stringer_type.moi_xx = util.GeometryFunction(tokens[1], ("w", "h", "t", "a", "z"))
         elif tokens[0] == "moi_zz":
-            stringer_type.moi_zz = util.GeometryFunction(tokens[1])
+            stringer_type.moi_zz = util.GeometryFunction(tokens[1], ("w", "h", "t", "a", "x"))
     return stringer_type
 
 
@@ -299,6 +312,13 @@ def init_stringer_types():
                 stringer_types.append(load_stringer_type(file.split('.')[0]))
 
 
+def get_wing(name):
+    if name not in wings:
+        wings[name] = load_wing(name)
+    # load cases share the wing box, engine and fuel tank, but each sets its own aerodynamic state on the wing
+    return copy.copy(wings[name])
+
+
 def get_material(name):
     if len(materials) == 0:
         init_material()
@@ -0,0 +1,182 @@
+import math
+
+import numpy as np
+from scipy import interpolate
+
+
+def add_coefficients(a, b):
+    if len(a) < len(b):
+        a, b = b, a
+    result = a.copy()
+    result[:len(b)] += b
+    return result
+
+
+def trim_coefficients(a):
+    nonzero = np.flatnonzero(a)
+    return a[:nonzero[-1] + 1] if len(nonzero) > 0 else a[:1]
+
+
+def evaluate_coefficients(a, x):
+    # Horner's scheme, the coefficients being ordered from the lowest power up
+    result = np.full(np.shape(x), a[-1])
+    for coefficient in a[-2::-1]:
+        result = result * x + coefficient
+    return result
+
+
+def as_rational(value):
+    if isinstance(value, Rational):
+        return value
+    if np.ndim(value) == 0 and np.isrealobj(value):
+        return Rational([float(value)])
+    raise TypeError("%s is not a rational function" % type(value).__name__)
+
+
+class Rational:
+    # quotient of two polynomials, given by their coefficients from the lowest power up, closed under + - * / and
+    # integer powers; section formulas run on these instead of numbers give their exact expression in y
+
+    __array_ufunc__ = None  # numpy scalars defer to the operators below, numpy functions are not rational
+
+    def __init__(self, numerator, denominator=(1.0,)):
+        numerator = trim_coefficients(np.asarray(numerator, dtype=float))
+        denominator = trim_coefficients(np.asarray(denominator, dtype=float))
+        if len(denominator) == 1:
+            # a constant denominator is folded into the numerator, so polynomials stay polynomials
+            numerator = numerator / denominator[0]
+            denominator = np.ones(1)
+        self.numerator = numerator
+        self.denominator = denominator
+
+    def __call__(self, x):
+        return evaluate_coefficients(self.numerator, x) / evaluate_coefficients(self.denominator, x)
+
+    def __add__(self, other):
+        other = as_rational(other)
+        if np.array_equal(self.denominator, other.denominator):
+            return Rational(add_coefficients(self.numerator, other.numerator), self.denominator)
+        return Rational(add_coefficients(np.convolve(self.numerator, other.denominator),
+                                         np.convolve(other.numerator, self.denominator)),
+                        np.convolve(self.denominator, other.denominator))
+
+    def __radd__(self, other):
+        return self + other
+
+    def __neg__(self):
+        return Rational(-self.numerator, self.denominator)
+
+    def __sub__(self, other):
+        return self + -as_rational(other)
+
+    def __rsub__(self, other):
+        return as_rational(other) - self
+
+    def __mul__(self, other):
+        other = as_rational(other)
+        return Rational(np.convolve(self.numerator, other.numerator), np.convolve(self.denominator, other.denominator))
+
+    def __rmul__(self, other):
+        return self * other
+
+    def __truediv__(self, other):
+        other = as_rational(other)
+        return Rational(np.convolve(self.numerator, other.denominator), np.convolve(self.denominator, other.numerator))
+
+    def __rtruediv__(self, other):
+        return as_rational(other) / self
+
+    def __pow__(self, power):
+        if np.ndim(power) != 0 or power != int(power):
+            raise TypeError("Rational functions only have integer powers")
+        result = Rational([1.0])
+        base = self if power >= 0 else 1 / self
+        for i in range(abs(int(power))):
+            result = result * base
+        return result
+
+    def is_polynomial(self):
+        return len(self.denominator) == 1
+
+
+class PiecewiseRational:
+    # one rational function per section in the coordinate local to the section, discontinuous at the joints
+
+    def __init__(self, starts, ends, pieces):
+        self.starts = np.asarray(starts, dtype=float)
+        self.ends = np.asarray(ends, dtype=float)
+        self.pieces = pieces
+        # a station on a joint belongs to the inboard section, like WingBox.get_section_indices
+        self.boundaries = self.ends[:-1]
+
+    def __call__(self, y):
+        if np.ndim(y) == 0:
+            i = np.searchsorted(self.boundaries, y, side='left')
+            return float(self.pieces[i](y - self.starts[i]))
+        y = np.asarray(y, dtype=float)
+        results = np.zeros(y.shape)
+        indices = np.searchsorted(self.boundaries, y, side='left')
+        for i, piece in enumerate(self.pieces):
+            mask = indices == i
+            if np.any(mask):
+                results[mask] = piece(y[mask] - self.starts[i])
+        return results
+
+
+class InboardPPoly(interpolate.PPoly):
+    # scipy PPoly taking the value of the interval inboard of a breakpoint on it, like a station on a section joint
+    # belongs to the inboard section and the engine load to the stations up to and including the engine; stage results
+    # are these, breaking at the section joints, the engine and the other spanwise discontinuities
+
+    def __call__(self, x, nu=0, extrapolate=None):
+        x = np.asarray(x, dtype=float)
+        if len(self.x) > 2:
+            indices = np.clip(np.searchsorted(self.x, x), 1, len(self.x) - 2)
+            x = np.where(x == self.x[indices], np.nextafter(x, -np.inf), x)
+        return super().__call__(x, nu, extrapolate)
+
+
+def join(parts, x):
+    # the sum of the piecewise polynomials in parts as one over the breakpoints x, which must include theirs; on
+    # every interval each part is replaced by its Taylor expansion at the left end, which is exact; that expansion
+    # is the one of the interval outboard of the left end, so the parts are evaluated as plain PPoly
+    degree = max(len(part.c) for part in parts) - 1
+    x = np.asarray(x, dtype=float)
+    c = np.zeros((degree + 1, len(x) - 1))
+    for part in parts:
+        for k in range(len(part.c)):
+            c[degree - k] += interpolate.PPoly.__call__(part, x[:-1], k) / math.factorial(k)
+    return InboardPPoly(c, x, extrapolate=True)
+
+
+def add(*parts):
+    return join(parts, np.unique(np.concatenate([part.x for part in parts])))
+
+
+def step(start_y, y, end_y, inboard, outboard):
+    # inboard up to y, outboard from there on
+    return InboardPPoly([[inboard, outboard]], [start_y, y, end_y], extrapolate=True)
+
+
+def interpolate_sections(y, values, sections):
+    # cubic spline through the values at the stations of every section, which jumps at the section joints like the
+    # section properties; a station on a joint belongs to the inboard section
+    starts = np.array([section.start_y for section in sections])
+    ends = np.array([section.end_y for section in sections])
+    y = np.asarray(y, dtype=float)
+    values = np.asarray(values, dtype=float)
+    indices = np.searchsorted(ends[:-1], y, side='left')
+    x = [starts[0]]
+    c = []
+    for i in range(len(starts)):
+        mask = indices == i
+        if np.count_nonzero(mask) > 1:
+            spline = interpolate.make_interp_spline(y[mask], values[mask], k=min(3, np.count_nonzero(mask) - 1))
+            part = interpolate.PPoly.from_spline(spline, extrapolate=True)
+        else:
+            part = interpolate.PPoly([[values[mask][0] if np.any(mask) else np.nan]], [starts[i], ends[i]], extrapolate=True)
+        section_x = np.unique(np.concatenate(([starts[i], ends[i]], y[mask])))
+        section_c = join([part], section_x).c
+        c.append(np.vstack((np.zeros((4 - len(section_c), section_c.shape[1])), section_c)))
+        x.extend(section_x[1:])
+    return InboardPPoly(np.hstack(c), x, extrapolate=True)
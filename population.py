@@ -0,0 +1,241 @@
+import numpy as np
+
+import structure
+
+
+class WingBoxPopulation:
+    # many variants of a wing box as struct of arrays: one array per parameter, with the sections of all variants in
+    # a row and their stringer sets after each other, so a population of thousands of variants is a handful of
+    # contiguous arrays instead of thousands of objects; variants share the width, height and material of the wing box
+    # they derive from, sections and stringer sets are free
+
+    section_fields = ("start_y", "end_y", "front_spar_t", "back_spar_t", "top_panel_t", "bottom_panel_t")
+    stringer_set_fields = ("amount", "stringer_width", "stringer_height", "stringer_thickness", "start_x", "end_x",
+                           "surface_top")
+    dtypes = {"amount": np.int32, "surface_top": bool}
+
+    def __init__(self, name, width, height, material, stringer_types, start_y, end_y, section_counts,
+                 stringer_set_counts, sections, stringer_sets, stringer_type_indices):
+        self.name = name
+        self.width = width        # GeometryFunction shared by the variants
+        self.height = height      # GeometryFunction shared by the variants
+        self.material = material  # Material shared by the variants
+        self.stringer_types = stringer_types  # StringerType objects the stringer sets point to
+        self.start_y = np.asarray(start_y, dtype=float)  # per variant
+        self.end_y = np.asarray(end_y, dtype=float)
+        # variant i has the sections section_offsets[i]:section_offsets[i + 1], section j the stringer sets
+        # stringer_set_offsets[j]:stringer_set_offsets[j + 1]
+        self.section_offsets = np.concatenate(([0], np.cumsum(section_counts))).astype(np.int64)
+        self.stringer_set_offsets = np.concatenate(([0], np.cumsum(stringer_set_counts))).astype(np.int64)
+        self.sections = {field: np.asarray(sections[field], dtype=float) for field in self.section_fields}
+        self.stringer_sets = {field: np.asarray(stringer_sets[field], dtype=self.dtypes.get(field, float))
+                              for field in self.stringer_set_fields}
+        self.stringer_type_indices = np.asarray(stringer_type_indices, dtype=np.int32)
+
+    @classmethod
+    def from_wing_boxes(cls, wing_boxes, name=None):
+        base = wing_boxes[0]
+        for wing_box in wing_boxes[1:]:
+            if wing_box.width.function != base.width.function or wing_box.height.function != base.height.function or \
+                    wing_box.material.key() != base.material.key():
+                raise ValueError("Wing box %s does not have the width, height and material of %s" % (wing_box.name, base.name))
+        sections = [section for wing_box in wing_boxes for section in wing_box.sections]
+        stringer_sets = [stringer_set for section in sections for stringer_set in section.stringer_sets]
+        stringer_types = []
+        stringer_type_indices = []
+        for stringer_set in stringer_sets:
+            if stringer_set.stringer_type not in stringer_types:
+                stringer_types.append(stringer_set.stringer_type)
+            stringer_type_indices.append(stringer_types.index(stringer_set.stringer_type))
+        return cls(name if name is not None else base.name, base.width, base.height, base.material, stringer_types,
+                   [wing_box.start_y for wing_box in wing_boxes], [wing_box.end_y for wing_box in wing_boxes],
+                   [len(wing_box.sections) for wing_box in wing_boxes],
+                   [len(section.stringer_sets) for section in sections],
+                   {field: [getattr(section, field) for section in sections] for field in cls.section_fields},
+                   {field: [getattr(stringer_set, field) for stringer_set in stringer_sets] for field in cls.stringer_set_fields},
+                   stringer_type_indices)
+
+    @classmethod
+    def repeat(cls, wing_box, size):
+        # size copies of one wing box, to be varied in place through the arrays
+        single = cls.from_wing_boxes([wing_box])
+        section_counts = np.full(size, len(wing_box.sections))
+        stringer_set_counts = np.tile(np.diff(single.stringer_set_offsets), size)
+        return cls(single.name, single.width, single.height, single.material, single.stringer_types,
+                   np.repeat(single.start_y, size), np.repeat(single.end_y, size), section_counts, stringer_set_counts,
+                   {field: np.tile(values, size) for field, values in single.sections.items()},
+                   {field: np.tile(values, size) for field, values in single.stringer_sets.items()},
+                   np.tile(single.stringer_type_indices, size))
+
+    def __len__(self):
+        return len(self.start_y)
+
+    def __getitem__(self, index):
+        if not -len(self) <= index < len(self):
+            raise IndexError("Wing box %d is not in a population of %d" % (index, len(self)))
+        return WingBoxView(self, index % len(self))
+
+    def calc_memory(self):
+        # [bytes] of the arrays
+        arrays = [self.start_y, self.end_y, self.section_offsets, self.stringer_set_offsets, self.stringer_type_indices]
+        arrays += list(self.sections.values()) + list(self.stringer_sets.values())
+        return sum(array.nbytes for array in arrays)
+
+    def select(self, indices):
+        # the population of the variants at indices, in that order
+        indices = np.asarray(indices, dtype=int)
+        section_counts = np.diff(self.section_offsets)[indices]
+        sections = gather(self.section_offsets[indices], section_counts)
+        stringer_set_counts = np.diff(self.stringer_set_offsets)[sections]
+        stringer_sets = gather(self.stringer_set_offsets[sections], stringer_set_counts)
+        return WingBoxPopulation(self.name, self.width, self.height, self.material, self.stringer_types,
+                                 self.start_y[indices], self.end_y[indices], section_counts, stringer_set_counts,
+                                 {field: values[sections] for field, values in self.sections.items()},
+                                 {field: values[stringer_sets] for field, values in self.stringer_sets.items()},
+                                 self.stringer_type_indices[stringer_sets])
+
+    def section_range(self, index):
+        return range(self.section_offsets[index], self.section_offsets[index + 1])
+
+    def stringer_set_range(self, section):
+        return range(self.stringer_set_offsets[section], self.stringer_set_offsets[section + 1])
+
+    def variant_indices(self):
+        # variant of every section and of every stringer set, to broadcast per variant values onto them
+        sections = np.repeat(np.arange(len(self)), np.diff(self.section_offsets))
+        return sections, np.repeat(sections, np.diff(self.stringer_set_offsets))
+
+    def calc_stringer_areas(self):
+        # area of every stringer set, the geometry functions of each stringer type run once on all its sets
+        areas = np.zeros(len(self.stringer_type_indices))
+        for i, stringer_type in enumerate(self.stringer_types):
+            mask = self.stringer_type_indices == i
+            if np.any(mask):
+                area = stringer_type.calc_area(self.stringer_sets["stringer_width"][mask],
+                                               self.stringer_sets["stringer_height"][mask],
+                                               self.stringer_sets["stringer_thickness"][mask])
+                areas[mask] = np.broadcast_to(area, np.count_nonzero(mask))
+        return areas * self.stringer_sets["amount"]
+
+    def calc_weight(self, order=8):
+        # [N] weight of every wing box, like ShearCalculator.calc_weight_wing_box: the material area integrated over
+        # every section with Gauss-Legendre points, the width and height of all sections evaluated at once
+        points, weights = np.polynomial.legendre.leggauss(order)
+        start = self.sections["start_y"][:, None]
+        length = self.sections["end_y"][:, None] - start
+        y = start + length * (points + 1) / 2
+        width = np.broadcast_to(self.width.evaluate(y=y), y.shape)
+        height = np.broadcast_to(self.height.evaluate(y=y), y.shape)
+        width_integral = np.sum(width * weights, axis=1) * length[:, 0] / 2
+        height_integral = np.sum(height * weights, axis=1) * length[:, 0] / 2
+        section_variants, stringer_set_variants = self.variant_indices()
+        stringer_set_sections = np.repeat(np.arange(len(section_variants)), np.diff(self.stringer_set_offsets))
+        stringer_areas = np.bincount(stringer_set_sections, self.calc_stringer_areas(), len(section_variants))
+        volume = width_integral * (self.sections["top_panel_t"] + self.sections["bottom_panel_t"]) + \
+            height_integral * (self.sections["front_spar_t"] + self.sections["back_spar_t"]) + stringer_areas * length[:, 0]
+        return 9.81 * self.material.density * np.bincount(section_variants, volume, len(self))
+
+    def to_wing_box(self, index):
+        return self[index].to_structure()
+
+    def to_wing_boxes(self):
+        return [self.to_wing_box(i) for i in range(len(self))]
+
+
+def gather(starts, counts):
+    # indices of the runs of counts elements from every start, one after the other
+    offsets = np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(starts, counts) + np.arange(np.sum(counts)) - offsets
+
+
+def array_field(group, field):
+    # attribute of a view, read from and written to the arrays of the population
+    def get_value(view):
+        return getattr(view.population, group)[field][view.index].item()
+
+    def set_value(view, value):
+        getattr(view.population, group)[field][view.index] = value
+
+    return property(get_value, set_value)
+
+
+class WingBoxView:
+
+    __slots__ = ("population", "index")
+
+    def __init__(self, population, index):
+        self.population = population
+        self.index = index
+
+    @property
+    def name(self):
+        return "%s[%d]" % (self.population.name, self.index)
+
+    @property
+    def start_y(self):
+        return self.population.start_y[self.index].item()
+
+    @property
+    def end_y(self):
+        return self.population.end_y[self.index].item()
+
+    @property
+    def sections(self):
+        return [SectionView(self.population, i) for i in self.population.section_range(self.index)]
+
+    def to_structure(self):
+        wing_box = structure.WingBox()
+        wing_box.name = self.name
+        wing_box.start_y = self.start_y
+        wing_box.end_y = self.end_y
+        wing_box.width = self.population.width
+        wing_box.height = self.population.height
+        wing_box.material = self.population.material
+        wing_box.sections = [section.to_structure() for section in self.sections]
+        return wing_box
+
+
+class SectionView:
+
+    __slots__ = ("population", "index")
+
+    def __init__(self, population, index):
+        self.population = population
+        self.index = index
+
+    @property
+    def stringer_sets(self):
+        return [StringerSetView(self.population, i) for i in self.population.stringer_set_range(self.index)]
+
+    def to_structure(self):
+        section = structure.WingBoxSection()
+        for field in WingBoxPopulation.section_fields:
+            setattr(section, field, getattr(self, field))
+        section.stringer_sets = [stringer_set.to_structure() for stringer_set in self.stringer_sets]
+        return section
+
+
+class StringerSetView:
+
+    __slots__ = ("population", "index")
+
+    def __init__(self, population, index):
+        self.population = population
+        self.index = index
+
+    @property
+    def stringer_type(self):
+        return self.population.stringer_types[self.population.stringer_type_indices[self.index]]
+
+    def to_structure(self):
+        stringer_set = structure.StringerSet()
+        stringer_set.stringer_type = self.stringer_type
+        for field in WingBoxPopulation.stringer_set_fields:
+            setattr(stringer_set, field, getattr(self, field))
+        return stringer_set
+
+
+for name in WingBoxPopulation.section_fields:
+    setattr(SectionView, name, array_field("sections", name))
+for name in WingBoxPopulation.stringer_set_fields:
+    setattr(StringerSetView, name, array_field("stringer_sets", name))
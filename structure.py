@@ -1,6 +1,11 @@
+import collections
+
 import numpy as np
 import scipy as sp
 
+import integration
+import piecewise
+
 
 class Wing:
 
@@ -9,25 +14,25 @@ class Wing:
         self.wing_box = None    # WingBox object
         self.engine = None      # Engine object
         self.fuel_tank = None   # FuelTank object
+        self.xflr_directory = "xflr"  # directory with the XFLR exports of this wing
         self.chord = None       # c(y) [m]
-        self.cl0 = None         # cl(y) [m] at aoa =  0 [deg]
-        self.cl10 = None        # cl(y) [m] at aoa = 10 [deg]
-        self.cd0 = None         # cd(y) [m] at aoa =  0 [deg]
-        self.cd10 = None        # cd(y) [m] at aoa = 10 [deg]
-        self.cm0 = None         # cm(y) [m] at aoa =  0 [deg]
-        self.cm10 = None        # cm(y) [m] at aoa = 10 [deg]
-        self.interp_cons = 0    # constant
+        self.cl_distribution = None  # cl(y) [-] at the angle of attack of the load case
+        self.cd_distribution = None  # cd(y) [-] at the angle of attack of the load case
+        self.cm_distribution = None  # cm(y) [-] at the angle of attack of the load case
+        self.interp_cons = 0    # blend factor between the two XFLR polars around the required CL
+        self.loads = None       # AeroLoads of the load case
         self.aoa = 0            # [rad]
         self.surface_area = 0   # [m^2]
+        self.xflr_digests = ()  # hashes of the XFLR files the coefficients come from
 
     def cl(self, y):
-        return self.cl0(y) + self.interp_cons * (self.cl10(y) - self.cl0(y))
+        return self.cl_distribution(y)
 
     def cd(self, y):
-        return self.cd0(y) + self.interp_cons * (self.cd10(y) - self.cd0(y))
+        return self.cd_distribution(y)
 
     def cm(self, y):
-        return self.cm0(y) + self.interp_cons * (self.cm10(y) - self.cm0(y))
+        return self.cm_distribution(y)
 
     def normal(self, y, density, velocity):
         return sp.cos(self.aoa) * self.lift(density, velocity, y) + sp.sin(self.aoa) * self.drag(density, velocity, y)
@@ -41,6 +46,36 @@ class Wing:
     def moment(self, y, density, velocity):
         return 0.5 * density * velocity ** 2 * self.cm(y) * self.chord(y) ** 2
 
+    def build_loads(self, stations, density, velocity):
+        # between the XFLR stations lift and drag are quartic and the moment quintic, so 6 Gauss points are exact
+        integrator = integration.SpanwiseIntegrator(stations, 6)
+        return AeroLoads(integrator.integrate(lambda y: self.lift(y, density, velocity)),
+                         integrator.integrate(lambda y: self.drag(y, density, velocity)),
+                         integrator.integrate(lambda y: self.moment(y, density, velocity)))
+
+    def key_aero(self):
+        return self.xflr_digests, self.interp_cons
+
+
+class AeroLoads:
+
+    def __init__(self, lift_integral, drag_integral, moment_integral):
+        self.lift_integral = lift_integral      # integral of the lift from the root [N]
+        self.drag_integral = drag_integral      # integral of the drag from the root [N]
+        self.moment_integral = moment_integral  # integral of the pitching moment from the root [Nm]
+        self.lift = lift_integral.derivative()      # [N/m]
+        self.drag = drag_integral.derivative()      # [N/m]
+        self.moment = moment_integral.derivative()  # [Nm/m]
+
+    def lift_from_tip(self, tip):
+        return integration.from_tip(self.lift_integral, tip)
+
+    def drag_from_tip(self, tip):
+        return integration.from_tip(self.drag_integral, tip)
+
+    def moment_from_tip(self, tip):
+        return integration.from_tip(self.moment_integral, tip)
+
 
 class WingBox:
 
@@ -54,6 +89,14 @@ class WingBox:
         self.sections = []
         self.moi_xx = None
         self.moi_polar = None
+        self.moi_keys = {}  # key of the geometry each MoI interpolant was attached for, see attach_moi
+        self.properties = None  # SectionProperties, built on first use
+        self.properties_key = None  # key of the geometry the properties were built for
+
+    def key(self):
+        # geometry only, the material is keyed separately
+        return self.start_y, self.end_y, self.width.function, self.height.function, \
+            tuple(section.key() for section in self.sections)
 
     def calc_width(self, y):
         return self.width.evaluate(y=y)
@@ -62,56 +105,71 @@ class WingBox:
         return self.height.evaluate(y=y)
 
     def calc_material_area(self, y):
-        section = self.get_active_section(y)
-        return section.calc_material_area(self.calc_width(y), self.calc_height(y))
+        return self.map_property("material_area", y)
 
     def calc_area_cross_sectional(self, y):
-        section = self.get_active_section(y)
-        return section.calc_area_cross_sectional(self.calc_width(y), self.calc_height(y))
+        return self.map_property("area_cross_sectional", y)
 
     def calc_circumference(self, y):
         return 2 * (self.calc_width(y) + self.calc_height(y))
 
     def calc_centroid_x(self, y):
-        return self.get_active_section(y).calc_centroid_x(self.calc_width(y), self.calc_height(y))
+        return self.map_property("centroid_x", y)
 
     def calc_centroid_z(self, y):
-        return self.get_active_section(y).calc_centroid_z(self.calc_width(y), self.calc_height(y))
+        return self.map_property("centroid_z", y)
 
     def calc_moi_xx(self, y):
-        if self.moi_xx is not None:
-            return self.moi_xx(y)
+        moi_xx = self.get_moi("moi_xx")
+        if moi_xx is not None:
+            return moi_xx(y)
         else:
-            width = self.calc_width(y)
-            height = self.calc_height(y)
-            section = self.get_active_section(y)
-            centroid_z = self.calc_centroid_z(y)
-            moi_xx = section.calc_moi_xx_parallel_axis(width, height, centroid_z)
-            inside_height = height - section.top_panel_t - section.bottom_panel_t
-            for stringer_set in section.stringer_sets:
-                moi_xx += stringer_set.calc_moi_xx_parallel_axis(inside_height, centroid_z)
-            return moi_xx
+            return self.map_property("moi_xx", y)
 
     def calc_moi_zz(self, y):
-        width = self.calc_width(y)
-        height = self.calc_height(y)
-        section = self.get_active_section(y)
-        centroid_x = self.calc_centroid_x(y)
-        moi_zz = section.calc_moi_zz(width, height) + \
-            section.calc_material_area(width, height) * centroid_x ** 2
-        inside_width = width - section.front_spar_t - section.bottom_spar_t
-        for stringer_set in section.stringer_sets:
-            moi_zz += stringer_set.calc_moi_zz_parallel_axis(inside_width, centroid_x)
-        return moi_zz
+        return self.map_property("moi_zz", y)
 
     def calc_moi_polar(self, y):
-        if self.moi_polar is not None:
-            return self.moi_polar(y)
+        moi_polar = self.get_moi("moi_polar")
+        if moi_polar is not None:
+            return moi_polar(y)
         else:
-            section = self.get_active_section(y)
-            integral = self.calc_width(y) * (section.top_panel_t + section.bottom_panel_t) / (section.top_panel_t * section.bottom_panel_t) + \
-                self.calc_height(y) * (section.front_spar_t + section.back_spar_t) / (section.front_spar_t * section.back_spar_t)
-            return 4 * self.calc_area_cross_sectional(y) ** 2 / integral
+            return self.map_property("moi_polar", y)
+
+    def attach_moi(self, name, func):
+        # MoI interpolant computed by a stage, used by calc_moi_xx or calc_moi_polar until the geometry is edited
+        setattr(self, name, func)
+        self.moi_keys[name] = self.key()
+
+    def get_moi(self, name):
+        func = getattr(self, name)
+        if func is not None and self.moi_keys.get(name) == self.key():
+            return func
+        return None
+
+    def calc_properties(self):
+        # closed form section properties, None when the width or height is not a polynomial in y; rebuilt when the
+        # geometry of the wing box or its sections is edited
+        key = self.key()
+        if key != self.properties_key:
+            self.properties = SectionProperties.build(self)
+            self.properties_key = key
+        return self.properties
+
+    def reset_properties(self):
+        # also drops the MoI interpolants attached by the stages
+        self.properties = None
+        self.properties_key = None
+        self.moi_xx = None
+        self.moi_polar = None
+        self.moi_keys = {}
+
+    def map_property(self, name, y):
+        properties = self.calc_properties()
+        if properties is not None:
+            return getattr(properties, name)(y)
+        return self.map_sections(y, lambda section, y2: getattr(section, SectionProperties.methods[name])(
+            self.calc_width(y2), self.calc_height(y2)))
 
     def get_active_section(self, y):
         for section in self.sections:
@@ -119,6 +177,65 @@ class WingBox:
                 return section
         return None
 
+    def get_section_indices(self, y):
+        # sections are sorted along the span, a station on a joint belongs to the inboard section
+        boundaries = [section.end_y for section in self.sections[:-1]]
+        return np.searchsorted(boundaries, y, side='left')
+
+    def map_sections(self, y, func):
+        if np.ndim(y) == 0:
+            return func(self.get_active_section(y), y)
+        y = np.asarray(y, dtype=float)
+        results = np.zeros(y.shape)
+        indices = self.get_section_indices(y)
+        for i, section in enumerate(self.sections):
+            mask = indices == i
+            if np.any(mask):
+                results[mask] = func(section, y[mask])
+        return results
+
+
+class SectionProperties:
+    # properties of a wing box as exact rational functions of y, one per section, with steps at the section joints
+
+    # WingBoxSection method computing each property from the width and height
+    methods = {
+        "material_area": "calc_material_area",
+        "area_cross_sectional": "calc_area_cross_sectional",
+        "centroid_x": "calc_centroid_x",
+        "centroid_z": "calc_centroid_z",
+        "moi_xx": "calc_moi_xx_stiffened",
+        "moi_zz": "calc_moi_zz_stiffened",
+        "moi_polar": "calc_moi_polar",
+    }
+
+    def __init__(self, properties):
+        self.material_area = properties["material_area"]
+        self.area_cross_sectional = properties["area_cross_sectional"]
+        self.centroid_x = properties["centroid_x"]
+        self.centroid_z = properties["centroid_z"]
+        self.moi_xx = properties["moi_xx"]
+        self.moi_zz = properties["moi_zz"]
+        self.moi_polar = properties["moi_polar"]
+
+    @classmethod
+    def build(cls, wing_box):
+        # the section formulas are run on the width and height as polynomials in the coordinate local to the
+        # section, thicknesses and stringers being constant along a section
+        pieces = {name: [] for name in cls.methods}
+        for section in wing_box.sections:
+            y = piecewise.Rational([section.start_y, 1.0])
+            try:
+                width = piecewise.as_rational(wing_box.width.evaluate(y=y))
+                height = piecewise.as_rational(wing_box.height.evaluate(y=y))
+            except (TypeError, ValueError, AttributeError):
+                return None
+            for name, method in cls.methods.items():
+                pieces[name].append(piecewise.as_rational(getattr(section, method)(width, height)))
+        starts = [section.start_y for section in wing_box.sections]
+        ends = [section.end_y for section in wing_box.sections]
+        return cls({name: piecewise.PiecewiseRational(starts, ends, pieces[name]) for name in cls.methods})
+
 
 class WingBoxSection:
 
@@ -130,36 +247,34 @@ class WingBoxSection:
         self.top_panel_t = 0
         self.bottom_panel_t = 0
         self.stringer_sets = []
+        self.properties = None  # StringerSums of the stringer sets, rebuilt when one of them is edited
+
+    def calc_properties(self):
+        stringer_sets = tuple(stringer_set.calc_properties() for stringer_set in self.stringer_sets)
+        if self.properties is None or self.properties.stringer_sets != stringer_sets:
+            self.properties = StringerSums.build(stringer_sets)
+        return self.properties
 
     def calc_material_area(self, width, height):
         a = width * (self.top_panel_t + self.bottom_panel_t) + height * (self.front_spar_t + self.back_spar_t)
-        for stringer_set in self.stringer_sets:
-            a += stringer_set.calc_area()
-        return a
+        return a + self.calc_properties().area
 
     def calc_area_cross_sectional(self, width, height):
         return (width - self.front_spar_t - self.back_spar_t) * (height - self.top_panel_t - self.bottom_panel_t)
 
     def calc_centroid_x(self, width, height):
+        stringers = self.calc_properties()
         ax = height * width * (self.back_spar_t - self.front_spar_t) / 2
-        a = height * (self.front_spar_t + self.back_spar_t)
-        for stringer_set in self.stringer_sets:
-            area = stringer_set.calc_area()
-            x = (width - self.front_spar_t - self.back_spar_t) * (stringer_set.calc_centroid_x() - 0.5)
-            ax += area * x
-            a += area
+        ax += (width - self.front_spar_t - self.back_spar_t) * stringers.moment_x
+        a = height * (self.front_spar_t + self.back_spar_t) + stringers.area
         return ax / a
 
     def calc_centroid_z(self, width, height):
+        # stringers at the inside of the panels, their centroid_z measured from the panel
+        stringers = self.calc_properties()
         az = width * height * (self.top_panel_t - self.bottom_panel_t) / 2
-        a = height * (self.top_panel_t + self.bottom_panel_t)
-        for stringer_set in self.stringer_sets:
-            area = stringer_set.calc_area()
-            z = (height - self.top_panel_t - self.bottom_panel_t) * 0.5 - stringer_set.calc_centroid_z()
-            if not stringer_set.surface_top:
-                z = -z
-            az += area * z
-            a += area
+        az += (height - self.top_panel_t - self.bottom_panel_t) * 0.5 * stringers.signed_area - stringers.signed_moment_z
+        a = height * (self.top_panel_t + self.bottom_panel_t) + stringers.area
         return az / a
 
     def calc_moi_xx(self, width, height):
@@ -178,8 +293,28 @@ class WingBoxSection:
     def calc_moi_zz(self, width, height):
         return width ** 3 * height / 12 - (width - self.front_spar_t - self.back_spar_t) ** 3 * (height - self.top_panel_t - self.bottom_panel_t) / 12
 
-    def calc_moi_polar(self, y, width, height):
-        print(self.start_y + y)
+    def calc_moi_xx_stiffened(self, width, height):
+        centroid_z = self.calc_centroid_z(width, height)
+        moi_xx = self.calc_moi_xx_parallel_axis(width, height, centroid_z)
+        # the sum of StringerSet.calc_moi_xx_parallel_axis over the stringer sets
+        stringers = self.calc_properties()
+        return moi_xx + stringers.moi_xx + stringers.second_moment_z - 2 * centroid_z * stringers.moment_z + \
+            centroid_z ** 2 * stringers.area
+
+    def calc_moi_zz_stiffened(self, width, height):
+        centroid_x = self.calc_centroid_x(width, height)
+        moi_zz = self.calc_moi_zz(width, height) + self.calc_material_area(width, height) * centroid_x ** 2
+        inside_width = width - self.front_spar_t - self.back_spar_t
+        return moi_zz + self.calc_properties().calc_moi_zz_parallel_axis(inside_width, centroid_x)
+
+    def calc_moi_polar(self, width, height):
+        integral = width * (self.top_panel_t + self.bottom_panel_t) / (self.top_panel_t * self.bottom_panel_t) + \
+            height * (self.front_spar_t + self.back_spar_t) / (self.front_spar_t * self.back_spar_t)
+        return 4 * self.calc_area_cross_sectional(width, height) ** 2 / integral
+
+    def key(self):
+        return self.start_y, self.end_y, self.front_spar_t, self.back_spar_t, self.top_panel_t, self.bottom_panel_t, \
+            tuple(stringer_set.key() for stringer_set in self.stringer_sets)
 
     def __hash__(self):
         return hash((self.start_y, self.end_y, self.front_spar_t, self.back_spar_t, self.top_panel_t, self.bottom_panel_t))
@@ -197,11 +332,11 @@ class FuelTank:
         self.end_y = 0  # [m]
         self.wing_box = None
 
+    def key(self):
+        return self.start_y, self.end_y, self.rho_fuel
+
     def fuel_cross_section(self, y):
-        if self.start_y <= y <= self.end_y:
-            return self.wing_box.calc_area_cross_sectional(y)
-        else:
-            return 0.0
+        return np.where((self.start_y <= y) & (y <= self.end_y), self.wing_box.calc_area_cross_sectional(y), 0.0)
 
 
 class Engine:
@@ -213,6 +348,9 @@ class Engine:
         self.thrust = 0  # [N]
         self.weight = 0  # [N]
 
+    def key(self):
+        return self.x, self.y, self.z, self.thrust, self.weight
+
 
 class StringerType:
 
@@ -224,6 +362,10 @@ class StringerType:
         self.moi_xx = None
         self.moi_zz = None
 
+    def key(self):
+        return self.name, self.area.function, self.centroid_x.function, self.centroid_z.function, \
+            self.moi_xx.function, self.moi_zz.function
+
     def calc_area(self, width, height, thickness):
         return self.area.evaluate(w=width, h=height, t=thickness)
 
@@ -239,7 +381,7 @@ class StringerType:
 
     def calc_moi_zz(self, width, height, thickness):
         return self.moi_zz.evaluate(w=width, h=height, t=thickness, a=self.calc_area(width, height, thickness),
-                                    z=self.calc_centroid_x(width, height, thickness))
+                                    x=self.calc_centroid_x(width, height, thickness))
 
 
 class StringerSet:
@@ -253,64 +395,101 @@ class StringerSet:
         self.start_x = 0  # fraction of wing box width [-]
         self.end_x = 0  # fraction [-]
         self.surface_top = True  # True if top, False if bottom
+        self.properties = None  # StringerSetProperties, rebuilt when the set is edited
+
+    def key(self):
+        return self.stringer_type.key(), self.amount, self.stringer_width, self.stringer_height, \
+            self.stringer_thickness, self.start_x, self.end_x, self.surface_top
+
+    def calc_properties(self):
+        key = self.key()
+        if self.properties is None or self.properties.key != key:
+            self.properties = StringerSetProperties.build(self, key)
+        return self.properties
 
     def calc_area(self):
-        return self.stringer_type.calc_area(self.stringer_width, self.stringer_height, self.stringer_thickness) * \
-            self.amount
+        return self.calc_properties().area
 
     def calc_centroid_x(self, width):
         return width * (self.start_x + (self.end_x - self.start_x) / 2)
 
     def calc_centroid_z(self):
-        centroid = self.stringer_type.calc_centroid_z(self.stringer_width, self.stringer_height, self.stringer_thickness)
-        if self.stringer_height - centroid < centroid: centroid = self.stringer_height - centroid
-        return centroid
+        return self.calc_properties().centroid_z
 
     def calc_moi_xx(self):
-        return self.stringer_type.calc_moi_xx(self.stringer_width, self.stringer_height, self.stringer_thickness) * \
-            self.amount
+        return self.calc_properties().moi_xx
 
     def calc_moi_xx_parallel_axis(self, height, location):
-        centroid = self.calc_centroid_z()
-        if centroid > (self.stringer_height - centroid):
-            centroid = (self.stringer_height - centroid)
-        z = height / 2 - centroid
-        if self.surface_top:
-            z -= location
-        else:
-            z += location
-        return self.calc_moi_xx() + self.calc_area() * (centroid - location) ** 2
+        properties = self.calc_properties()
+        return properties.moi_xx + properties.area * (properties.centroid_z - location) ** 2
 
     def calc_moi_zz(self, width):
-        centroid_stringer = self.stringer_type.calc_centroid_x(self.stringer_width, self.stringer_height,
-                                                               self.stringer_thickness)
-        if centroid_stringer > (self.stringer_width - centroid_stringer):
-            centroid_stringer = self.stringer_width - centroid_stringer
-        start_x = self.start_x * width + centroid_stringer
-        end_x = self.end_x * width - centroid_stringer
-        centroid = self.calc_centroid_x(width)
-        area = self.stringer_type.calc_area(self.stringer_width, self.stringer_height, self.stringer_thickness)
-        moi_zz = self.amount * self.stringer_type.calc_moi_zz(self.stringer_width, self.stringer_height,
-                                                              self.stringer_thickness)
-        stringer_x = np.linspace(start_x, end_x, self.amount)
-        for x in stringer_x:
-            moi_zz += area * (centroid - x) ** 2
-        return moi_zz
+        return self.calc_moi_zz_parallel_axis(width, self.calc_centroid_x(width))
+
+    def calc_moi_zz_parallel_axis(self, width, location):
+        return self.calc_properties().calc_moi_zz_parallel_axis(width, location)
+
+
+class StringerMoments:
+    # moments of the stringers about the z axis at a location x, for a wing box width that may be a function of y:
+    # every stringer is at x = u width + v, so the sum over them of area (location - x)^2 expands into the sums below
 
     def calc_moi_zz_parallel_axis(self, width, location):
-        centroid_stringer = self.stringer_type.calc_centroid_x(self.stringer_width, self.stringer_height,
-                                                               self.stringer_thickness)
-        if centroid_stringer > (self.stringer_width - centroid_stringer):
-            centroid_stringer = self.stringer_width - centroid_stringer
-        start_x = self.start_x * width + centroid_stringer
-        end_x = self.end_x * width - centroid_stringer
-        area = self.stringer_type.calc_area(self.stringer_width, self.stringer_height, self.stringer_thickness)
-        moi_zz = self.amount * self.stringer_type.calc_moi_zz(self.stringer_width, self.stringer_height,
-                                                              self.stringer_thickness)
-        stringer_x = np.linspace(start_x, end_x, self.amount)
-        for x in stringer_x:
-            moi_zz += area * (location - x) ** 2
-        return moi_zz
+        return self.moi_zz + self.area * location ** 2 - 2 * location * (width * self.moment_u + self.moment_v) + \
+            width ** 2 * self.second_moment_u + 2 * width * self.second_moment_uv + self.second_moment_v
+
+
+class StringerSetProperties(StringerMoments, collections.namedtuple("StringerSetProperties", [
+        "key", "surface_top", "area", "centroid_x", "centroid_z", "moi_xx", "moi_zz", "moment_u", "moment_v",
+        "second_moment_u", "second_moment_uv", "second_moment_v"])):
+    # properties of a stringer set, constant for its dimensions; built once instead of evaluating the geometry
+    # functions of the stringer type on every query
+
+    __slots__ = ()
+
+    @classmethod
+    def build(cls, stringer_set, key):
+        stringer_type = stringer_set.stringer_type
+        dimensions = (stringer_set.stringer_width, stringer_set.stringer_height, stringer_set.stringer_thickness)
+        area = stringer_type.calc_area(*dimensions)
+        # measured from the panel, on whichever side of the stringer is closest to it
+        centroid_z = stringer_type.calc_centroid_z(*dimensions)
+        centroid_z = min(centroid_z, stringer_set.stringer_height - centroid_z)
+        centroid_x = stringer_type.calc_centroid_x(*dimensions)
+        centroid_x = min(centroid_x, stringer_set.stringer_width - centroid_x)
+        # stringers spaced evenly from start_x width + centroid_x to end_x width - centroid_x
+        fraction = np.linspace(0, 1, stringer_set.amount)
+        u = stringer_set.start_x + (stringer_set.end_x - stringer_set.start_x) * fraction
+        v = centroid_x * (1 - 2 * fraction)
+        return cls(key, stringer_set.surface_top, area * stringer_set.amount, stringer_set.calc_centroid_x(1), centroid_z,
+                   stringer_type.calc_moi_xx(*dimensions) * stringer_set.amount,
+                   stringer_type.calc_moi_zz(*dimensions) * stringer_set.amount, float(area * np.sum(u)),
+                   float(area * np.sum(v)), float(area * np.sum(u ** 2)), float(area * np.sum(u * v)),
+                   float(area * np.sum(v ** 2)))
+
+
+class StringerSums(StringerMoments, collections.namedtuple("StringerSums", [
+        "stringer_sets", "area", "moment_x", "signed_area", "signed_moment_z", "moi_xx", "moment_z",
+        "second_moment_z", "moi_zz", "moment_u", "moment_v", "second_moment_u", "second_moment_uv",
+        "second_moment_v"])):
+    # sums over the stringer sets of a section that the section properties need, z measured from the panels and
+    # signed towards the top
+
+    __slots__ = ()
+
+    @classmethod
+    def build(cls, stringer_sets):
+        area = np.array([properties.area for properties in stringer_sets])
+        centroid_z = np.array([properties.centroid_z for properties in stringer_sets])
+        sign = np.array([1.0 if properties.surface_top else -1.0 for properties in stringer_sets])
+        centroid_x = np.array([properties.centroid_x for properties in stringer_sets])
+        sums = {name: float(sum(getattr(properties, name) for properties in stringer_sets))
+                for name in ("moi_xx", "moi_zz", "moment_u", "moment_v", "second_moment_u", "second_moment_uv",
+                             "second_moment_v")}
+        return cls(stringer_sets, area=float(np.sum(area)), moment_x=float(np.sum(area * (centroid_x - 0.5))),
+                   signed_area=float(np.sum(area * sign)), signed_moment_z=float(np.sum(area * sign * centroid_z)),
+                   moment_z=float(np.sum(area * centroid_z)), second_moment_z=float(np.sum(area * centroid_z ** 2)),
+                   **sums)
 
 
 class Material:
@@ -323,16 +502,28 @@ class Material:
         self.yield_stress = 0
         self.density = 0
 
+    def key(self):
+        return self.name, self.e_modulus, self.shear_modulus, self.poisson_factor, self.yield_stress, self.density
+
 
 class LoadCase:
 
     def __init__(self):
+        self.name = ""
         self.range = None
         self.wing = None
         self.step = 0
+        self.tolerance = None  # error target of adaptive stations, which replace the uniform step when set
+        self.order = 3  # Gauss points per integration interval
         self.load_factor = 0
         self.velocity = 0
         self.density = 0
         self.aircraft_weight = 0
         self.limit_deflection = 0
         self.limit_twist = 0
+
+    def calc_range(self):
+        if self.tolerance is not None:
+            import mesh  # mesh builds on the calculators, which import this module
+            return mesh.adaptive_range(self, self.tolerance)
+        return np.arange(self.wing.wing_box.start_y, self.wing.wing_box.end_y, self.step)
@@ -0,0 +1,113 @@
+import copy
+import glob
+import itertools
+import os
+
+import numpy as np
+
+import main
+import parse
+import util
+import wingloader
+
+
+class LoadCaseSweep:
+
+    distributions = ["shear", "moment", "rotation", "deflection", "torsion", "twist", "top_panel_stress",
+                     "bottom_panel_stress", "shear_buckling", "skin_buckling", "column_buckling"]
+    parameters = ["load_factor", "velocity", "density", "aircraft_weight"]
+
+    def __init__(self, load_cases, result_cache=None, threads=main.DataCalculator.threads):
+        self.load_cases = load_cases
+        self.threads = threads  # stages of a load case computed side by side
+        self.result_cache = result_cache
+        self.calculators = []
+
+    @classmethod
+    def from_files(cls, patterns, **kwargs):
+        names = []
+        for pattern in patterns:
+            matches = sorted(glob.glob("loadcases/%s.case" % pattern))
+            if len(matches) == 0:
+                raise ValueError("No load case matches '%s'" % pattern)
+            for match in matches:
+                name = os.path.splitext(os.path.basename(match))[0]
+                if name not in names:
+                    names.append(name)
+        return cls([parse.load_load_case(name) for name in names], **kwargs)
+
+    @classmethod
+    def from_grid(cls, base_case, **kwargs):
+        grid = {}
+        for parameter in cls.parameters:
+            if parameter in kwargs:
+                grid[parameter] = np.atleast_1d(kwargs.pop(parameter))
+        load_cases = []
+        for values in itertools.product(*grid.values()):
+            load_case = copy.copy(base_case)
+            load_case.wing = copy.copy(base_case.wing)
+            for parameter, value in zip(grid.keys(), values):
+                setattr(load_case, parameter, float(value))
+            load_case.name = "%s[%s]" % (base_case.name, ", ".join("%s=%g" % item for item in zip(grid.keys(), values)))
+            wingloader.load_wing_properties(load_case, load_case.wing)
+            load_case.range = load_case.calc_range()
+            load_cases.append(load_case)
+        return cls(load_cases, **kwargs)
+
+    def run(self, deflection=True, twist=True, stress=True, plot=False):
+        # section properties go first, so every wing box has its MoI interpolants attached before the other stages
+        self.calculators = [main.DataCalculator(load_case, plot, self.result_cache, self.threads)
+                            for load_case in self.load_cases]
+        for calculator in self.calculators:
+            calculator.analyze_moi()
+        for calculator in self.calculators:
+            print("")
+            print("Load case: %s" % calculator.load_case.name)
+            analyses = [name for name, selected in (("deflection", deflection), ("twist", twist), ("stress", stress)) if selected]
+            calculator.analyze(*analyses)
+        return SweepResult(self.load_cases, self.calculators)
+
+
+class SweepResult:
+
+    def __init__(self, load_cases, calculators):
+        self.load_cases = load_cases
+        self.stations = load_cases[0].range
+        self.parameters = {}
+        for parameter in LoadCaseSweep.parameters:
+            self.parameters[parameter] = np.array([getattr(load_case, parameter) for load_case in load_cases])
+        # every distribution is stacked into a (load case, station) array, evaluated on the stations of the first case
+        self.distributions = {}
+        for name in LoadCaseSweep.distributions:
+            functions = [getattr(calculator, name) for calculator in calculators]
+            if all(function is not None for function in functions):
+                self.distributions[name] = np.array([function(self.stations) for function in functions])
+        # at the tip of every wing box, which the stations stop short of
+        self.tips = {}
+        for name in ["deflection", "twist"]:
+            if name in self.distributions:
+                self.tips[name] = np.array([float(getattr(calculator, name)(calculator.wing_box.end_y))
+                                            for calculator in calculators])
+
+    def __getitem__(self, name):
+        return self.distributions[name]
+
+    def save(self, directory):
+        names = list(self.distributions.keys())
+        for i in range(len(self.load_cases)):
+            data = np.column_stack([self.stations] + [self.distributions[name][i] for name in names])
+            np.savetxt(os.path.join(directory, util.file_name("%s.csv" % self.load_cases[i].name)), data,
+                       delimiter=",", header=",".join(["y"] + names), comments="")
+
+    def print_result(self):
+        print("")
+        print("Results for load case sweep")
+        for i in range(len(self.load_cases)):
+            line = "Load case: {0}".format(self.load_cases[i].name)
+            if "moment" in self.distributions:
+                line += "; maximum bending moment: {0:.3e} [Nm]".format(np.max(np.abs(self.distributions["moment"][i])))
+            if "deflection" in self.distributions:
+                line += "; tip deflection: {0:.3f} [m]".format(self.tips["deflection"][i])
+            if "twist" in self.distributions:
+                line += "; tip twist: {0:.2f} [deg]".format(np.degrees(self.tips["twist"][i]))
+            print(line)
@@ -0,0 +1,45 @@
+import contextlib
+import io
+import os
+import types
+
+import numpy as np
+
+import convergence
+import main
+import parse
+
+
+def create_calculator(step, margin):
+    # a calculator of a wing box from 0 to 1 [m] with every margin given by margin(y) and no loads
+    wing_box = types.SimpleNamespace(end_y=1.0)
+    load_case = types.SimpleNamespace(range=np.arange(0, 1 + step / 2, step), wing=types.SimpleNamespace(wing_box=wing_box))
+    return types.SimpleNamespace(load_case=load_case, deflection=lambda y: 0.0, twist=lambda y: 0.0,
+                                 top_panel_stress=np.zeros_like, bottom_panel_stress=np.zeros_like,
+                                 shear_buckling=margin, skin_buckling=margin, column_buckling=margin)
+
+
+def test_minimum_between_coarse_stations():
+    # the margin dips to 1 at y = 0.25, between the stations of the coarsest level
+    def margin(y):
+        return 1 + 4 * (y - 0.25) ** 2
+
+    study = convergence.ConvergenceStudy(None, step=0.5)
+    coarse = study.calc_quantities(create_calculator(0.5, margin))
+    fine = study.calc_quantities(create_calculator(0.125, margin))
+    assert coarse["min_skin_margin"] == 1.25
+    assert fine["min_skin_margin"] == 1.0
+
+
+def test_levels_sampled_on_own_stations(monkeypatch):
+    monkeypatch.chdir(os.path.dirname(os.path.abspath(__file__)))
+    with contextlib.redirect_stdout(io.StringIO()):
+        load_case = parse.load_load_case("n-positive")
+        result = convergence.ConvergenceStudy(load_case, step=0.4, max_levels=2).run()
+    finest = convergence.ConvergenceStudy(load_case, step=0.2, max_levels=1).create_load_cases()[0]
+    calculator = main.DataCalculator(finest, False)
+    with contextlib.redirect_stdout(io.StringIO()):
+        calculator.analyze("stress")
+    expected = convergence.calc_min_margin(calculator.skin_buckling(finest.range))
+    assert result.values["min_skin_margin"][-1] == expected
+    assert expected < result.values["min_skin_margin"][0]
@@ -1,34 +1,67 @@
-import string
+import ast
+import re
 import sys
 
-from scipy import interpolate
+import numpy as np
+
+import instrument
 
 
 def print_err(*args, **kwargs):
     print(*args, file=sys.stderr, **kwargs)
 
-def load_k(file):
-    f = open(file, 'r')
-    lines = f.readlines()
-    f.close()
-    val = [[], []]
-    for line in lines:
-        tokens = line.split(',')
-        val[0].append(float(tokens[0]))
-        val[1].append(float(tokens[1]))
-    return interpolate.interp1d(val[0], val[1], kind="cubic", fill_value="extrapolate")
+def file_name(name):
+    return re.sub(r"[^\w.\-]+", "_", name)
 
 
 class GeometryFunction:
 
-    def __init__(self, function):
+    variables = ("y", "w", "h", "t", "a", "z", "x")
+    functions = {"sqrt": np.sqrt, "sin": np.sin, "cos": np.cos, "tan": np.tan, "exp": np.exp, "log": np.log,
+                 "abs": np.abs, "pi": np.pi}
+    nodes = (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Call, ast.Name, ast.Load, ast.Constant, ast.Add, ast.Sub,
+             ast.Mult, ast.Div, ast.Pow, ast.USub, ast.UAdd)
+    # a number directly followed by a name or bracket, e.g. 2t or 3(h - t), is an implicit multiplication
+    implicit_product = re.compile(r"(\b\d+\.?\d*(?:[eE][-+]?\d+)?|\.\d+(?:[eE][-+]?\d+)?)(?![eE][-+]?\d)\s*(?=[A-Za-z_(])")
+
+    def __init__(self, function, variables=variables):
         self.function = function
-        for c in string.ascii_lowercase:
-            if c in self.function:
-                self.function = self.function.replace(c, "{%s}" % c)
+        self.variables = variables
+        source = self.implicit_product.sub(r"\1 * ", function.strip())
+        try:
+            tree = ast.parse(source, mode="eval")
+        except SyntaxError:
+            raise ValueError("Invalid geometry function '%s'" % function)
+        names = set()
+        for node in ast.walk(tree):
+            if not isinstance(node, self.nodes):
+                raise ValueError("Invalid geometry function '%s': %s is not allowed" % (function, type(node).__name__))
+            if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float)):
+                raise ValueError("Invalid geometry function '%s': only numbers are allowed" % function)
+            if isinstance(node, ast.Call) and (not isinstance(node.func, ast.Name) or node.keywords):
+                raise ValueError("Invalid geometry function '%s': only plain function calls are allowed" % function)
+            if isinstance(node, ast.Call) and not callable(self.functions.get(node.func.id)):
+                # variables and constants such as pi can not be called
+                raise ValueError("Invalid geometry function '%s': '%s' is not a function, expected one of %s" %
+                                 (function, node.func.id, ", ".join(name for name, value in self.functions.items()
+                                                                    if callable(value))))
+            if isinstance(node, ast.Name) and node.id not in self.functions:
+                if node.id not in variables:
+                    raise ValueError("Invalid geometry function '%s': unknown variable '%s', expected one of %s" %
+                                     (function, node.id, ", ".join(variables)))
+                names.add(node.id)
+        self.names = tuple(name for name in variables if name in names)
+        namespace = dict(self.functions, __builtins__={})
+        self.compiled = eval(compile("lambda %s: %s" % ("".join(name + ", " for name in self.names) + "**_", source),
+                                     "<geometry>", "eval"), namespace)
 
     def evaluate(self, **kwargs):
-        return eval(self.function.format(**kwargs))
+        instrument.count("geometry_evaluations")
+        return self.compiled(**kwargs)
+
+    def __reduce__(self):
+        # the compiled lambda can not be pickled, so it is rebuilt from the source when sent to a worker
+        return GeometryFunction, (self.function, self.variables)
 
 
 class SkinPlate:
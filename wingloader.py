@@ -1,50 +1,176 @@
+import glob
+import hashlib
+import os
+
 import numpy as np
-import scipy as sp
 from scipy import interpolate
 
+import util
+
 
 class XFLRWing:
 
     CL = 0
+    alpha = 0       # [deg]
+    velocity = 0    # [m/s]
 
     chord = None
     cl = None
     cd = None
     cm = None
 
+    cache_version = 2
+    header_rows = 21
+    span_rows = 38
+
     def __init__(self, filename):
-        file = open(filename, "r")
-        for i in range(21):
-            line = file.readline()
-            if "CL" in line:
-                self.CL = float(line.split("=")[1].strip())
+        self.filename = filename
+        data = self.load_cache()
+        if data is None:
+            data = self.parse()
+            self.save_cache(data)
+        self.digest = str(data["digest"])
+        self.CL = float(data["CL"])
+        self.alpha = float(data["alpha"])
+        self.velocity = float(data["velocity"])
+        self.y = data["y"]
+        self.chord_values = data["chord"]
+        self.cl_values = data["cl"]
+        self.cd_values = data["cd"]
+        self.cm_values = data["cm"]
+
+        self.chord = interpolate.interp1d(self.y, self.chord_values, kind='linear', fill_value="extrapolate")
+        self.cl = interpolate.interp1d(self.y, self.cl_values, kind='cubic', fill_value="extrapolate")
+        self.cd = interpolate.interp1d(self.y, self.cd_values, kind='cubic', fill_value="extrapolate")
+        self.cm = interpolate.interp1d(self.y, self.cm_values, kind='cubic', fill_value="extrapolate")
+
+    def parse(self):
+        file = open(self.filename, "rb")
+        content = file.read()
         file.close()
+        lines = content.decode("cp1252").splitlines()
+        data = {"digest": hashlib.sha256(content).hexdigest(), "CL": 0.0, "alpha": 0.0, "velocity": 0.0}
+        for line in lines[:self.header_rows]:
+            tokens = [i.strip() for i in line.split("=")]
+            if tokens[0] == "CL":
+                data["CL"] = float(tokens[1])
+            elif tokens[0] == "Alpha":
+                data["alpha"] = float(tokens[1])
+            elif tokens[0] == "QInf":
+                data["velocity"] = float(tokens[1].split()[0])
+        rows = lines[self.header_rows:self.header_rows + self.span_rows]
+        data["y"], data["chord"], data["cl"], data["cd"], data["cm"] = np.loadtxt(rows, unpack=True, usecols=(0, 1, 3, 5, 7))
+        return data
 
-        y, c, cl, cd, cm = np.loadtxt(filename, skiprows=21, max_rows=38, unpack=True, usecols=(0, 1, 3, 5, 7), encoding="cp1252")
+    def cache_filename(self):
+        return self.filename + ".npz"
 
-        self.chord = interpolate.interp1d(y, c, kind='linear', fill_value="extrapolate")
-        self.cl = interpolate.interp1d(y, cl, kind='cubic', fill_value="extrapolate")
-        self.cd = interpolate.interp1d(y, cd, kind='cubic', fill_value="extrapolate")
-        self.cm = interpolate.interp1d(y, cm, kind='cubic', fill_value="extrapolate")
+    def load_cache(self):
+        # the cache is only used when it was written for the current version of the source file
+        try:
+            stat = os.stat(self.filename)
+            data = np.load(self.cache_filename())
+            if int(data["version"]) == self.cache_version and int(data["mtime"]) == stat.st_mtime_ns and \
+                    int(data["size"]) == stat.st_size:
+                return data
+        except (OSError, KeyError, ValueError):
+            pass
+        return None
 
+    def save_cache(self, data):
+        try:
+            stat = os.stat(self.filename)
+            temp_filename = "%s.%d.tmp.npz" % (self.filename, os.getpid())
+            np.savez(temp_filename, version=self.cache_version, mtime=stat.st_mtime_ns, size=stat.st_size, **data)
+            os.replace(temp_filename, self.cache_filename())
+        except OSError:
+            pass  # a read-only data directory only means the file is parsed again next time
 
-def load_wing_properties(load_case, wing):
-    file010 = "MainWing_a=0.00_v=10.00ms.txt"
-    file1010 = "MainWing_a=10.00_v=10.00ms.txt"
 
-    xflr0 = XFLRWing("xflr/" + file010)
-    xflr10 = XFLRWing("xflr/" + file1010)
+class XFLRPolar:
+    # spanwise coefficients of one load case, blended from the two polars that bracket the required CL
+
+    def __init__(self, y, chord, cl, cd, cm, interp_cons, aoa, digests):
+        self.y = y
+        self.chord = chord
+        self.cl = cl
+        self.cd = cd
+        self.cm = cm
+        self.interp_cons = interp_cons
+        self.aoa = aoa              # [rad]
+        self.digests = digests
+
+
+class XFLRDatabase:
+
+    def __init__(self, directory):
+        self.directory = directory
+        xflr_wings = []
+        for filename in sorted(glob.glob(os.path.join(directory, "*.txt"))):
+            try:
+                xflr_wings.append(get_xflr_wing(filename))
+            except ValueError:
+                util.print_err("Skipping %s: not an XFLR export" % filename)
+        if len(xflr_wings) < 2:
+            raise ValueError("At least two XFLR exports are needed in %s" % directory)
+        # every polar is put on the span stations of the first one, so a load case is a blend of two table rows
+        self.y = xflr_wings[0].y
+        self.chord = xflr_wings[0].chord_values
+        self.velocities = np.unique([xflr_wing.velocity for xflr_wing in xflr_wings])
+        self.polars = {}
+        for velocity in self.velocities:
+            group = sorted([xflr_wing for xflr_wing in xflr_wings if xflr_wing.velocity == velocity], key=lambda xflr_wing: xflr_wing.CL)
+            self.polars[velocity] = {
+                "CL": np.array([xflr_wing.CL for xflr_wing in group]),
+                "alpha": np.array([xflr_wing.alpha for xflr_wing in group]),
+                "cl": np.array([xflr_wing.cl(self.y) for xflr_wing in group]),
+                "cd": np.array([xflr_wing.cd(self.y) for xflr_wing in group]),
+                "cm": np.array([xflr_wing.cm(self.y) for xflr_wing in group]),
+                "digests": [xflr_wing.digest for xflr_wing in group],
+            }
+
+    def find_polar(self, cl_req, velocity):
+        polars = self.polars[self.velocities[np.argmin(np.abs(self.velocities - velocity))]]
+        if len(polars["CL"]) < 2:
+            raise ValueError("At least two XFLR exports at the same velocity are needed in %s" % self.directory)
+        # the bracketing pair, or the outermost pair when the required CL has to be extrapolated
+        i = int(np.clip(np.searchsorted(polars["CL"], cl_req) - 1, 0, len(polars["CL"]) - 2))
+        interp_cons = (cl_req - polars["CL"][i]) / (polars["CL"][i + 1] - polars["CL"][i])
+        alpha = np.radians(polars["alpha"][i:i + 2])
+        aoa = np.arcsin(np.sin(alpha[0]) + interp_cons * (np.sin(alpha[1]) - np.sin(alpha[0])))
+        blend = lambda table: table[i] + interp_cons * (table[i + 1] - table[i])
+        return XFLRPolar(self.y, self.chord, blend(polars["cl"]), blend(polars["cd"]), blend(polars["cm"]), interp_cons,
+                         aoa, tuple(polars["digests"][i:i + 2]))
+
+
+xflr_wings = {}
+xflr_databases = {}
+
+
+def get_xflr_wing(filename):
+    if filename not in xflr_wings:
+        xflr_wings[filename] = XFLRWing(filename)
+    return xflr_wings[filename]
+
+
+def get_xflr_database(directory):
+    if directory not in xflr_databases:
+        xflr_databases[directory] = XFLRDatabase(directory)
+    return xflr_databases[directory]
+
+
+def load_wing_properties(load_case, wing):
+    database = get_xflr_database(wing.xflr_directory)
 
     cl_req = (load_case.load_factor * load_case.aircraft_weight) / (0.5 * load_case.density * load_case.velocity ** 2 * wing.surface_area)
-    interp_cons = (cl_req - xflr0.CL) / (xflr10.CL - xflr0.CL)
-    aoa = sp.arcsin(interp_cons * sp.sin(10 * sp.pi / 180))  # in radians
-    print("Angle of attack: %d [deg]" % (aoa * 180 / sp.pi))
-
-    wing.interp_cons = interp_cons
-    wing.cl0 = xflr0.cl
-    wing.cl10 = xflr10.cl
-    wing.cd0 = xflr0.cd
-    wing.cd10 = xflr10.cd
-    wing.cm0 = xflr0.cm
-    wing.cm10 = xflr10.cm
-    wing.chord = xflr0.chord
+    polar = database.find_polar(cl_req, load_case.velocity)
+    print("Angle of attack: %d [deg]" % np.degrees(polar.aoa))
+
+    wing.interp_cons = polar.interp_cons
+    wing.aoa = polar.aoa
+    wing.xflr_digests = polar.digests
+    wing.chord = interpolate.interp1d(polar.y, polar.chord, kind='linear', fill_value="extrapolate")
+    wing.cl_distribution = interpolate.interp1d(polar.y, polar.cl, kind='cubic', fill_value="extrapolate")
+    wing.cd_distribution = interpolate.interp1d(polar.y, polar.cd, kind='cubic', fill_value="extrapolate")
+    wing.cm_distribution = interpolate.interp1d(polar.y, polar.cm, kind='cubic', fill_value="extrapolate")
+    wing.loads = wing.build_loads(polar.y, load_case.density, load_case.velocity)